@@ -1,20 +1,88 @@
+import asyncio
+import logging
 import os
+from dotenv import load_dotenv
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import uri_parser
 from typing import Optional
 
+from app.utils.pool_metrics import pool_metrics
+from app.utils.query_metrics import query_metrics
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+# Read once at import; the client is created by init_database at startup
+MONGODB_URL = os.getenv("MONGODB_URL", "mongodb://localhost:27017/quantum_dashboard")
+DATABASE_NAME = os.getenv("DATABASE_NAME")
+# "mongodb", or "memory" for an in-process mongomock store (needs mongomock-motor; benchmarks and CI only)
+MONGO_BACKEND = os.getenv("MONGO_BACKEND", "mongodb").lower()
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", 100))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", 10))
+MONGO_MAX_IDLE_TIME_MS = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", 300000))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", 5000))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", 5000))
+# Connections opened eagerly at startup so the first requests do not pay for handshakes
+MONGO_WARM_CONNECTIONS = int(os.getenv("MONGO_WARM_CONNECTIONS", MONGO_MIN_POOL_SIZE))
+
 _client: Optional[AsyncIOMotorClient] = None
 
 
+def _create_client() -> AsyncIOMotorClient:
+    if MONGO_BACKEND == "memory":
+        from mongomock_motor import AsyncMongoMockClient
+        logger.warning("Using the in-memory MongoDB backend; data is lost on exit")
+        return AsyncMongoMockClient(MONGODB_URL)
+    if MONGO_BACKEND != "mongodb":
+        raise ValueError(f"Unknown MONGO_BACKEND: {MONGO_BACKEND}")
+    return AsyncIOMotorClient(
+        MONGODB_URL,
+        maxPoolSize=MONGO_MAX_POOL_SIZE,
+        minPoolSize=MONGO_MIN_POOL_SIZE,
+        maxIdleTimeMS=MONGO_MAX_IDLE_TIME_MS,
+        waitQueueTimeoutMS=MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        event_listeners=[pool_metrics, query_metrics],
+    )
+
+
 def _get_client() -> AsyncIOMotorClient:
     global _client
     if _client is None:
-        mongodb_url = os.getenv("MONGODB_URL", "mongodb://localhost:27017/quantum_dashboard")
-        _client = AsyncIOMotorClient(mongodb_url)
+        # Scripts and tests may use the database without the app lifespan
+        _client = _create_client()
     return _client
 
 
+async def init_database():
+    """Create the client and warm its connection pool"""
+    client = _get_client()
+    warm = min(MONGO_WARM_CONNECTIONS, MONGO_MAX_POOL_SIZE)
+    if warm <= 0 or MONGO_BACKEND == "memory":
+        return
+    try:
+        # Concurrent pings each check out their own connection
+        await asyncio.gather(*(client.admin.command("ping") for _ in range(warm)))
+        logger.info(f"MongoDB pool warmed with {warm} connections")
+    except Exception as e:
+        logger.error(f"MongoDB warm-up failed: {e}")
+
+
+async def close_database():
+    """Close the client and its pooled connections"""
+    global _client
+    if _client is not None:
+        _client.close()
+        _client = None
+
+
 async def get_database():
     """Return the application's MongoDB database instance."""
     client = _get_client()
-    db_name = os.getenv("DATABASE_NAME")
-    return client[db_name] if db_name else client.get_default_database()
+    if DATABASE_NAME:
+        return client[DATABASE_NAME]
+    if MONGO_BACKEND == "memory":
+        # mongomock's get_default_database returns a synchronous handle
+        return client[uri_parser.parse_uri(MONGODB_URL)["database"] or "test"]
+    return client.get_default_database()
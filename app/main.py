@@ -1,8 +1,46 @@
 import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from .database import get_database
+from .database import close_database, get_database, init_database
+from .utils.redis_client import redis_client
+from .utils.pool_metrics import pool_metrics
+from .utils.query_metrics import DbTimingMiddleware, query_metrics
+from .utils import indexes
+from .services.connection_manager import connection_manager
+from .services.routing_registry import routing_registry
+from .services.presence_service import presence_service
+from .services.capsule_scheduler import capsule_scheduler
+from .utils.password_pool import password_pool
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await init_database()
+    if indexes.MONGO_ENSURE_INDEXES:
+        indexes.load_index_declarations()
+        await indexes.ensure_indexes(await get_database())
+    await redis_client.connect()
+    await routing_registry.start()
+    # Receive cluster events even before the first WebSocket connects
+    connection_manager.dispatcher.ensure_started()
+    connection_manager.status_debouncer.ensure_started()
+    connection_manager.typing_coalescer.ensure_started()
+    presence_service.ensure_started()
+    capsule_scheduler.ensure_started()
+    yield
+    await capsule_scheduler.stop()
+    await connection_manager.dispatcher.stop()
+    await connection_manager.status_debouncer.stop()
+    await connection_manager.typing_coalescer.stop()
+    password_pool.shutdown()
+    await presence_service.stop()
+    # Routes of sockets still open would otherwise outlive this node
+    await routing_registry.stop(list(connection_manager.active_connections))
+    await redis_client.disconnect()
+    await close_database()
+
+app = FastAPI(lifespan=lifespan)
+# Attributes Mongo commands to routes for /api/metrics and the Server-Timing header
+app.add_middleware(DbTimingMiddleware)
 
 @app.get("/api/health")
 async def health_check():
@@ -13,6 +51,17 @@ async def health_check():
     except Exception as exc:
         return {"status": "error", "detail": str(exc)}
 
+@app.get("/api/metrics")
+async def metrics():
+    """Connection pool and worker pool counters for this process"""
+    return {
+        "mongo_pool": pool_metrics.get_stats(),
+        "queries": query_metrics.get_stats(),
+        "password_pool": password_pool.get_stats(),
+        "capsule_scheduler": capsule_scheduler.get_stats(),
+        "indexes": indexes.last_report
+    }
+
 @app.get("/api/users")
 async def list_users():
     db = await get_database()
@@ -26,6 +26,17 @@ class TemporalCapsule(BaseModel):
     status: CapsuleStatus = CapsuleStatus.LOCKED
     tags: List[str] = []
 
+class CapsuleSummary(BaseModel):
+    # Listing view; content can be large and is left out
+    id: str
+    title: str
+    description: Optional[str] = None
+    capsule_type: CapsuleType
+    unlock_date: datetime
+    created_at: datetime
+    status: CapsuleStatus
+    tags: List[str] = []
+
 class CapsuleCreate(BaseModel):
     title: str
     description: Optional[str] = None
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr, Field
-from typing import Optional, List
+from typing import Any, Dict, Optional, List
 from datetime import datetime
 
 class User(BaseModel):
@@ -15,6 +15,8 @@ class User(BaseModel):
     total_capsules: int = 0
     unlocked_capsules: int = 0
     quantum_connections: List[str] = []
+    # Bumped to revoke every claims-bearing token issued before
+    token_version: int = 0
 
 class UserCreate(BaseModel):
     username: str
@@ -22,12 +24,34 @@ class UserCreate(BaseModel):
     full_name: Optional[str] = None
     password: str
 
-class UserResponse(BaseModel):
+class UserIdentity(BaseModel):
+    """The authenticated user; all a claims-bearing token carries"""
     id: str
     username: str
     email: EmailStr
-    full_name: Optional[str] = None
     is_active: bool
     quantum_level: int
+
+class UserResponse(UserIdentity):
+    # Editable, so read from the user document rather than token claims
+    full_name: Optional[str] = None
     total_capsules: int
     unlocked_capsules: int
+
+class BulkUserCreate(BaseModel):
+    # Validated row by row, so one bad row does not reject the whole batch
+    users: List[Dict[str, Any]]
+
+class BulkUserResult(BaseModel):
+    index: int
+    username: Optional[str] = None
+    email: Optional[str] = None
+    # created, duplicate, invalid or error
+    status: str
+    id: Optional[str] = None
+    detail: Optional[str] = None
+
+class BulkUserResponse(BaseModel):
+    created: int
+    failed: int
+    results: List[BulkUserResult]
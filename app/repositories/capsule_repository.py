@@ -0,0 +1,46 @@
+from app.database import get_database
+from bson import ObjectId
+from typing import Dict, Iterable, List
+
+# Named projections: each use case reads only the fields it renders
+CAPSULE_PROJECTIONS = {
+    # Capsules listed to users they were shared with; content is dropped unless permitted
+    "shared": {
+        "title": 1, "description": 1, "capsule_type": 1, "unlock_date": 1,
+        "created_at": 1, "status": 1, "content": 1
+    },
+    # Notifications and activity entries
+    "title": {"title": 1},
+}
+
+
+def _object_ids(capsule_ids: Iterable[str]) -> List[ObjectId]:
+    return [ObjectId(capsule_id) for capsule_id in set(capsule_ids) if ObjectId.is_valid(capsule_id)]
+
+
+class CapsuleRepository:
+    def __init__(self):
+        self.collection_name = "temporal_capsules"
+
+    async def _collection(self):
+        db = await get_database()
+        return db[self.collection_name]
+
+    async def get_many(self, capsule_ids: Iterable[str], view: str) -> Dict[str, dict]:
+        """Capsules by id in one $in query, keyed by string id; unknown ids are left out"""
+        object_ids = _object_ids(capsule_ids)
+        if not object_ids:
+            return {}
+        collection = await self._collection()
+        cursor = collection.find({"_id": {"$in": object_ids}}, CAPSULE_PROJECTIONS[view])
+        return {str(capsule["_id"]): capsule async for capsule in cursor}
+
+    async def get_owned(self, capsule_id: str, owner_id: str, view: str):
+        collection = await self._collection()
+        return await collection.find_one(
+            {"_id": ObjectId(capsule_id), "user_id": owner_id},
+            CAPSULE_PROJECTIONS[view]
+        )
+
+
+capsule_repository = CapsuleRepository()
@@ -0,0 +1,64 @@
+from app.database import get_database
+from app.models.friendship import FriendshipStatus
+from typing import Dict, Iterable, List
+
+# Named projections: each use case reads only the fields it renders
+FRIENDSHIP_PROJECTIONS = {
+    # Who is connected to whom, and how
+    "edge": {"requester_id": 1, "addressee_id": 1, "status": 1},
+    # Pending request listings
+    "request": {"requester_id": 1, "addressee_id": 1, "created_at": 1},
+}
+
+
+def other_user_id(friendship: dict, user_id: str) -> str:
+    """The user on the other side of friendship from user_id"""
+    return friendship["addressee_id"] if friendship["requester_id"] == user_id else friendship["requester_id"]
+
+
+class FriendshipRepository:
+    def __init__(self):
+        self.collection_name = "friendships"
+
+    async def _collection(self):
+        db = await get_database()
+        return db[self.collection_name]
+
+    async def friend_ids(self, user_id: str) -> List[str]:
+        """Ids of the user's accepted friends"""
+        collection = await self._collection()
+        cursor = collection.find({
+            "$or": [
+                {"requester_id": user_id, "status": FriendshipStatus.ACCEPTED},
+                {"addressee_id": user_id, "status": FriendshipStatus.ACCEPTED}
+            ]
+        }, FRIENDSHIP_PROJECTIONS["edge"])
+        return [other_user_id(friendship, user_id) async for friendship in cursor]
+
+    async def pending(self, user_id: str) -> List[dict]:
+        """Pending requests sent or received by the user"""
+        collection = await self._collection()
+        cursor = collection.find({
+            "$or": [
+                {"addressee_id": user_id, "status": FriendshipStatus.PENDING},
+                {"requester_id": user_id, "status": FriendshipStatus.PENDING}
+            ]
+        }, FRIENDSHIP_PROJECTIONS["request"])
+        return await cursor.to_list(length=None)
+
+    async def between(self, user_id: str, other_ids: Iterable[str]) -> Dict[str, dict]:
+        """Friendships between user_id and each of other_ids in one query, keyed by the other user"""
+        other_ids = list(set(other_ids))
+        if not other_ids:
+            return {}
+        collection = await self._collection()
+        cursor = collection.find({
+            "$or": [
+                {"requester_id": user_id, "addressee_id": {"$in": other_ids}},
+                {"requester_id": {"$in": other_ids}, "addressee_id": user_id}
+            ]
+        }, FRIENDSHIP_PROJECTIONS["edge"])
+        return {other_user_id(friendship, user_id): friendship async for friendship in cursor}
+
+
+friendship_repository = FriendshipRepository()
@@ -0,0 +1,81 @@
+from app.database import get_database
+from bson import ObjectId
+from typing import Dict, Iterable, List, Optional
+
+# Named projections: each use case reads only the fields it renders
+USER_PROJECTIONS = {
+    # Existence checks and id lookups
+    "id": {"_id": 1},
+    # Embedded user references (friend requests, capsule owners)
+    "summary": {"username": 1, "full_name": 1},
+    # Friend lists and search results
+    "profile": {"username": 1, "full_name": 1, "quantum_level": 1, "last_login": 1},
+    # UserResponse
+    "response": {
+        "username": 1, "email": 1, "full_name": 1, "is_active": 1,
+        "quantum_level": 1, "total_capsules": 1, "unlocked_capsules": 1
+    },
+    # User, for password checks at login; skips quantum_connections
+    "auth": {
+        "username": 1, "email": 1, "full_name": 1, "hashed_password": 1, "is_active": 1,
+        "created_at": 1, "last_login": 1, "quantum_level": 1, "total_capsules": 1,
+        "unlocked_capsules": 1, "token_version": 1
+    },
+}
+
+
+def _object_ids(user_ids: Iterable[str]) -> List[ObjectId]:
+    return [ObjectId(user_id) for user_id in set(user_ids) if ObjectId.is_valid(user_id)]
+
+
+class UserRepository:
+    def __init__(self):
+        self.collection_name = "users"
+
+    async def _collection(self):
+        db = await get_database()
+        return db[self.collection_name]
+
+    async def get(self, user_id: str, view: str) -> Optional[dict]:
+        collection = await self._collection()
+        return await collection.find_one({"_id": ObjectId(user_id)}, USER_PROJECTIONS[view])
+
+    async def get_many(self, user_ids: Iterable[str], view: str) -> Dict[str, dict]:
+        """Users by id in one $in query, keyed by string id; unknown ids are left out"""
+        object_ids = _object_ids(user_ids)
+        if not object_ids:
+            return {}
+        collection = await self._collection()
+        cursor = collection.find({"_id": {"$in": object_ids}}, USER_PROJECTIONS[view])
+        return {str(user["_id"]): user async for user in cursor}
+
+    async def find_by_username(self, username: str, view: str) -> Optional[dict]:
+        collection = await self._collection()
+        return await collection.find_one({"username": username}, USER_PROJECTIONS[view])
+
+    async def find_by_login(self, login: str, view: str) -> Optional[dict]:
+        """User whose username or email matches login"""
+        collection = await self._collection()
+        return await collection.find_one(
+            {"$or": [{"username": login}, {"email": login}]},
+            USER_PROJECTIONS[view]
+        )
+
+    async def search(self, query: str, exclude_id: str, view: str, limit: int = 20) -> List[dict]:
+        """Users whose username or full name contains query, case-insensitively"""
+        collection = await self._collection()
+        cursor = collection.find({
+            "$and": [
+                {"_id": {"$ne": ObjectId(exclude_id)}},
+                {
+                    "$or": [
+                        {"username": {"$regex": query, "$options": "i"}},
+                        {"full_name": {"$regex": query, "$options": "i"}}
+                    ]
+                }
+            ]
+        }, USER_PROJECTIONS[view]).limit(limit)
+        return await cursor.to_list(length=limit)
+
+
+user_repository = UserRepository()
@@ -1,18 +1,33 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from pydantic import BaseModel
 from datetime import timedelta
+from typing import Optional
 import os
+import secrets
 
-from app.models.user import UserCreate, UserResponse
+from app.models.user import BulkUserCreate, BulkUserResponse, UserCreate, UserIdentity, UserResponse
 from app.utils.security import create_access_token, verify_token
-from app.services.auth_service import AuthService
+from app.services.auth_service import JWT_CLAIMS_MODE, auth_service
+from app.utils.password_pool import PasswordPoolOverloaded
 class TokenResponse(BaseModel):
     access_token: str
     token_type: str
 router = APIRouter(prefix="/auth", tags=["auth"])
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/token")
-auth_service = AuthService()
+
+def _auth_busy() -> HTTPException:
+    # Fail fast rather than letting bcrypt work queue up behind a login burst
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Authentication is busy, please retry",
+        headers={"Retry-After": "1"},
+    )
+
+def _token_data(user) -> dict:
+    if JWT_CLAIMS_MODE:
+        return auth_service.token_claims(user, getattr(user, "token_version", 0))
+    return {"sub": str(user.id)}
 
 # filepath: c:\Users\DELL\OneDrive\Desktop\dbpro\quantum-dashboard-backend\app\routers\auth.py
 @router.post("/register")
@@ -20,17 +35,43 @@ async def register(user_data: UserCreate):
     try:
         user = await auth_service.create_user(user_data)
         access_token_expires = timedelta(minutes=int(os.getenv("JWT_EXPIRE_MINUTES", 30)))
-        token = create_access_token(data={"sub": str(user.id)}, expires_delta=access_token_expires)
+        token = create_access_token(data=_token_data(user), expires_delta=access_token_expires)
         return {
             "token": token,
             "user": user
         }
+    except PasswordPoolOverloaded:
+        raise _auth_busy()
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+@router.post("/bulk-register", response_model=BulkUserResponse)
+async def bulk_register(
+    bulk_data: BulkUserCreate,
+    provisioning_key: Optional[str] = Header(None, alias="X-Provisioning-Key")
+):
+    """Provision many users at once; each row gets its own result"""
+    expected_key = os.getenv("PROVISIONING_API_KEY")
+    if not expected_key or not provisioning_key or not secrets.compare_digest(provisioning_key, expected_key):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid provisioning key")
+
+    max_batch = int(os.getenv("PROVISIONING_MAX_BATCH", 10000))
+    if len(bulk_data.users) > max_batch:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"At most {max_batch} users per request"
+        )
+
+    results = await auth_service.bulk_provision(bulk_data.users)
+    created = sum(1 for result in results if result.status == "created")
+    return BulkUserResponse(created=created, failed=len(results) - created, results=results)
+
 @router.post("/token", response_model=TokenResponse)
 async def login(form_data: OAuth2PasswordRequestForm = Depends()):
-    user = await auth_service.authenticate_user(form_data.username, form_data.password)
+    try:
+        user = await auth_service.authenticate_user(form_data.username, form_data.password)
+    except PasswordPoolOverloaded:
+        raise _auth_busy()
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -38,18 +79,51 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
             headers={"WWW-Authenticate": "Bearer"},
         )
     access_token_expires = timedelta(minutes=int(os.getenv("JWT_EXPIRE_MINUTES", 30)))
-    token = create_access_token(data={"sub": str(user.id)}, expires_delta=access_token_expires)
+    token = create_access_token(data=_token_data(user), expires_delta=access_token_expires)
     return TokenResponse(access_token=token, token_type="bearer")
 
-async def get_current_user(token: str = Depends(oauth2_scheme)) -> UserResponse:
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> UserIdentity:
     payload = verify_token(token)
     if payload is None or "sub" not in payload:
         raise HTTPException(status_code=401, detail="Invalid token")
-    user = await auth_service.get_current_user(payload["sub"])
+    # FastAPI resolves this once per request; repeat requests hit the process-wide cache
+    if JWT_CLAIMS_MODE and "ver" in payload:
+        # Claims-bearing token: no user lookup, only a cached token version check
+        user = await auth_service.user_from_claims(payload)
+        if user is None:
+            raise HTTPException(status_code=401, detail="Token revoked")
+    else:
+        user = await auth_service.get_current_user(payload["sub"])
+        if user is None:
+            raise HTTPException(status_code=401, detail="User not found")
+    return user
+
+async def get_current_user_profile(current_user: UserIdentity = Depends(get_current_user)) -> UserResponse:
+    """Current user including capsule counters, which claims-bearing tokens do not carry"""
+    if isinstance(current_user, UserResponse):
+        return current_user
+    user = await auth_service.get_current_user(current_user.id)
     if user is None:
         raise HTTPException(status_code=401, detail="User not found")
     return user
 
 @router.get("/me", response_model=UserResponse)
-async def read_users_me(current_user: UserResponse = Depends(get_current_user)):
+async def read_users_me(current_user: UserResponse = Depends(get_current_user_profile)):
     return current_user
+
+@router.post("/revoke")
+async def revoke_tokens(
+    token: str = Depends(oauth2_scheme),
+    current_user: UserIdentity = Depends(get_current_user)
+):
+    """Sign out everywhere by invalidating all claims-bearing tokens issued so far"""
+    if not JWT_CLAIMS_MODE:
+        raise HTTPException(status_code=400, detail="Token revocation requires JWT_CLAIMS_MODE")
+    if "ver" not in verify_token(token):
+        # Versionless tokens are never checked, so revoking would not sign this one out
+        raise HTTPException(status_code=409, detail="Token predates revocation; sign in again first")
+    try:
+        await auth_service.revoke_tokens(current_user.id)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return {"status": "revoked"}
@@ -1,20 +1,91 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
+from typing import List, Optional, Tuple
 from datetime import datetime, timedelta
-from app.models.capsule import TemporalCapsule, CapsuleCreate, CapsuleStatus
-from app.models.user import UserResponse
+from app.models.capsule import TemporalCapsule, CapsuleCreate, CapsuleStatus, CapsuleSummary
+from app.models.user import UserIdentity
 from app.routers.auth import get_current_user
+from app.services.auth_service import auth_service
 from app.database import get_database
 from app.services.permission_service import permission_service
+from app.services.capsule_scheduler import capsule_scheduler
 from app.models.permissions import ShareRequest
 from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from app.utils.indexes import declare_indexes
+import base64
+import binascii
+import os
 
 router = APIRouter(prefix="/capsules", tags=["temporal-capsules"])
 
+CAPSULE_PAGE_SIZE = int(os.getenv("CAPSULE_PAGE_SIZE", 50))
+CAPSULE_PAGE_MAX = int(os.getenv("CAPSULE_PAGE_MAX", 200))
+
+# Newest first, with _id breaking ties so pages never overlap or skip
+CAPSULE_LIST_SORT = [("created_at", DESCENDING), ("_id", DESCENDING)]
+
+# Everything CapsuleSummary needs; content can be large
+CAPSULE_SUMMARY_PROJECTION = {
+    "title": 1, "description": 1, "capsule_type": 1, "unlock_date": 1,
+    "created_at": 1, "status": 1, "tags": 1
+}
+
+declare_indexes(
+    "temporal_capsules",
+    # Listing and counting a user's capsules, newest first, in keyset pages
+    IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]),
+    # Unlockable capsules and per-status counts for a user
+    IndexModel([("user_id", ASCENDING), ("status", ASCENDING), ("unlock_date", ASCENDING)]),
+    # Summary listings filtered by status or tag
+    IndexModel([("user_id", ASCENDING), ("status", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]),
+    IndexModel([("user_id", ASCENDING), ("tags", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)])
+)
+
+def _encode_cursor(capsule: dict) -> str:
+    position = f"{capsule['created_at'].isoformat()}|{capsule['_id']}"
+    return base64.urlsafe_b64encode(position.encode()).decode()
+
+def _decode_cursor(cursor: str) -> Tuple[datetime, ObjectId]:
+    try:
+        created_at, capsule_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), ObjectId(capsule_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError, InvalidId):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+async def _capsule_page(
+    query: dict,
+    limit: int,
+    cursor: Optional[str],
+    projection: dict = None
+) -> Tuple[List[dict], Optional[str]]:
+    """One page of capsules after cursor, and the cursor for the next page if there is one"""
+    if cursor:
+        created_at, capsule_id = _decode_cursor(cursor)
+        query = {
+            **query,
+            "$or": [
+                {"created_at": {"$lt": created_at}},
+                {"created_at": created_at, "_id": {"$lt": capsule_id}}
+            ]
+        }
+    
+    db = await get_database()
+    # One extra document tells whether another page follows
+    cursor = db.temporal_capsules.find(query, projection).sort(CAPSULE_LIST_SORT).limit(limit + 1)
+    capsules = await cursor.to_list(length=limit + 1)
+    if len(capsules) > limit:
+        capsules = capsules[:limit]
+        return capsules, _encode_cursor(capsules[-1])
+    return capsules, None
+
 @router.post("/", response_model=TemporalCapsule)
 async def create_capsule(
     capsule_data: CapsuleCreate,
-    current_user: UserResponse = Depends(get_current_user)
+    current_user: UserIdentity = Depends(get_current_user)
 ):
     """Create a new temporal capsule"""
     db = await get_database()
@@ -34,71 +105,80 @@ async def create_capsule(
     
     result = await db.temporal_capsules.insert_one(capsule_dict)
     capsule_dict["id"] = str(result.inserted_id)
+    capsule_scheduler.schedule(capsule_dict["id"], current_user.id, capsule_data.unlock_date)
     
     # Update user capsule count
     await db.users.update_one(
         {"_id": ObjectId(current_user.id)},
         {"$inc": {"total_capsules": 1}}
     )
+    await auth_service.invalidate_user(current_user.id)
     
     return TemporalCapsule(**capsule_dict)
 
 @router.get("/", response_model=List[TemporalCapsule])
 async def get_user_capsules(
-    current_user: UserResponse = Depends(get_current_user)
+    response: Response,
+    limit: int = Query(CAPSULE_PAGE_SIZE, ge=1, le=CAPSULE_PAGE_MAX),
+    cursor: Optional[str] = None,
+    current_user: UserIdentity = Depends(get_current_user)
 ):
-    """Get all capsules created by the user"""
-    db = await get_database()
+    """Get the user's capsules, newest first; X-Next-Cursor is set when more pages follow"""
+    page, next_cursor = await _capsule_page({"user_id": current_user.id}, limit, cursor)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     
     capsules = []
-    cursor = db.temporal_capsules.find({"user_id": current_user.id})
-    
-    async for capsule in cursor:
+    for capsule in page:
         capsule["id"] = str(capsule["_id"])
         capsules.append(TemporalCapsule(**capsule))
     
     return capsules
 
+@router.get("/summary", response_model=List[CapsuleSummary])
+async def get_capsule_summaries(
+    response: Response,
+    status_filter: Optional[CapsuleStatus] = Query(None, alias="status"),
+    tag: Optional[str] = None,
+    limit: int = Query(CAPSULE_PAGE_SIZE, ge=1, le=CAPSULE_PAGE_MAX),
+    cursor: Optional[str] = None,
+    current_user: UserIdentity = Depends(get_current_user)
+):
+    """List the user's capsules without their content, optionally by status or tag"""
+    query = {"user_id": current_user.id}
+    if status_filter:
+        query["status"] = status_filter
+    if tag:
+        query["tags"] = tag
+    
+    page, next_cursor = await _capsule_page(query, limit, cursor, CAPSULE_SUMMARY_PROJECTION)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    
+    summaries = []
+    for capsule in page:
+        capsule["id"] = str(capsule["_id"])
+        summaries.append(CapsuleSummary(**capsule))
+    
+    return summaries
+
 @router.get("/unlockable")
 async def get_unlockable_capsules(
-    current_user: UserResponse = Depends(get_current_user)
+    current_user: UserIdentity = Depends(get_current_user)
 ):
     """Get capsules that are ready to be unlocked"""
-    db = await get_database()
-    
-    now = datetime.utcnow()
+    # The scheduler normally unlocks capsules on time; this catches up on any it has not reached
     capsules = []
-    
-    cursor = db.temporal_capsules.find({
-        "user_id": current_user.id,
-        "unlock_date": {"$lte": now},
-        "status": CapsuleStatus.LOCKED
-    })
-    
-    async for capsule in cursor:
-        # Update status to unlocked
-        await db.temporal_capsules.update_one(
-            {"_id": capsule["_id"]},
-            {"$set": {"status": CapsuleStatus.UNLOCKED}}
-        )
-        
+    for capsule in await capsule_scheduler.unlock_due(current_user.id):
         capsule["id"] = str(capsule["_id"])
-        capsule["status"] = CapsuleStatus.UNLOCKED
         capsules.append(TemporalCapsule(**capsule))
     
-    if capsules:
-        # Update user unlocked capsules count
-        await db.users.update_one(
-            {"_id": ObjectId(current_user.id)},
-            {"$inc": {"unlocked_capsules": len(capsules)}}
-        )
-    
     return capsules
 
 @router.get("/{capsule_id}", response_model=TemporalCapsule)
 async def get_capsule(
     capsule_id: str,
-    current_user: UserResponse = Depends(get_current_user)
+    current_user: UserIdentity = Depends(get_current_user)
 ):
     """Get a specific capsule by ID"""
     db = await get_database()
@@ -146,7 +226,7 @@ async def get_capsule(
 async def update_capsule(
     capsule_id: str,
     capsule_data: CapsuleCreate,
-    current_user: UserResponse = Depends(get_current_user)
+    current_user: UserIdentity = Depends(get_current_user)
 ):
     """Update a capsule (only if it's still locked)"""
     db = await get_database()
@@ -183,13 +263,14 @@ async def update_capsule(
         {"_id": ObjectId(capsule_id)},
         {"$set": update_data}
     )
+    capsule_scheduler.schedule(capsule_id, current_user.id, capsule_data.unlock_date)
     
     return {"status": "updated"}
 
 @router.delete("/{capsule_id}")
 async def delete_capsule(
     capsule_id: str,
-    current_user: UserResponse = Depends(get_current_user)
+    current_user: UserIdentity = Depends(get_current_user)
 ):
     """Delete a capsule"""
     db = await get_database()
@@ -208,6 +289,7 @@ async def delete_capsule(
     
     # Delete capsule
     await db.temporal_capsules.delete_one({"_id": ObjectId(capsule_id)})
+    capsule_scheduler.cancel(capsule_id)
     
     # Update user capsule count
     await db.users.update_one(
@@ -221,6 +303,7 @@ async def delete_capsule(
             {"_id": ObjectId(current_user.id)},
             {"$inc": {"unlocked_capsules": -1}}
         )
+    await auth_service.invalidate_user(current_user.id)
     
     return {"status": "deleted"}
 
@@ -228,7 +311,7 @@ async def delete_capsule(
 async def share_capsule(
     capsule_id: str,
     share_request: ShareRequest,
-    current_user: UserResponse = Depends(get_current_user)
+    current_user: UserIdentity = Depends(get_current_user)
 ):
     """Share a capsule with another user"""
     share_request.capsule_id = capsule_id
@@ -243,7 +326,7 @@ async def share_capsule(
 
 @router.get("/shared")
 async def get_shared_capsules(
-    current_user: UserResponse = Depends(get_current_user)
+    current_user: UserIdentity = Depends(get_current_user)
 ):
     """Get capsules shared with the current user"""
     shared_capsules = await permission_service.get_shared_capsules(current_user.id)
@@ -252,7 +335,7 @@ async def get_shared_capsules(
 @router.get("/{capsule_id}/access")
 async def check_capsule_access(
     capsule_id: str,
-    current_user: UserResponse = Depends(get_current_user)
+    current_user: UserIdentity = Depends(get_current_user)
 ):
     """Check user's access level to a capsule"""
     permission_level = await permission_service.check_capsule_permission(
@@ -276,7 +359,7 @@ async def check_capsule_access(
 async def revoke_capsule_access(
     capsule_id: str,
     user_id: str,
-    current_user: UserResponse = Depends(get_current_user)
+    current_user: UserIdentity = Depends(get_current_user)
 ):
     """Revoke capsule access from a user"""
     await permission_service.revoke_capsule_access(
@@ -3,14 +3,14 @@ from typing import List, Optional
 from app.models.chat import ChatMessage, Conversation, ChatMessageCreate
 from app.services.chat_service import chat_service
 from app.routers.auth import get_current_user
-from app.models.user import UserResponse
+from app.models.user import UserIdentity
 
 router = APIRouter(prefix="/chat", tags=["chat"])
 
 @router.post("/messages", response_model=ChatMessage)
 async def send_message(
     message_data: ChatMessageCreate,
-    current_user: UserResponse = Depends(get_current_user)
+    current_user: UserIdentity = Depends(get_current_user)
 ):
     """Send a chat message"""
     try:
@@ -23,7 +23,7 @@ async def send_message(
 
 @router.get("/conversations", response_model=List[Conversation])
 async def get_conversations(
-    current_user: UserResponse = Depends(get_current_user)
+    current_user: UserIdentity = Depends(get_current_user)
 ):
     """Get user's conversations"""
     return await chat_service.get_conversations(current_user.id)
@@ -31,7 +31,7 @@ async def get_conversations(
 @router.get("/conversations/{conversation_id}/messages")
 async def get_conversation_messages(
     conversation_id: str,
-    current_user: UserResponse = Depends(get_current_user),
+    current_user: UserIdentity = Depends(get_current_user),
     limit: int = Query(50, le=100),
     offset: int = Query(0, ge=0)
 ):
@@ -53,7 +53,7 @@ async def get_conversation_messages(
 @router.post("/conversations/{conversation_id}/read")
 async def mark_conversation_read(
     conversation_id: str,
-    current_user: UserResponse = Depends(get_current_user)
+    current_user: UserIdentity = Depends(get_current_user)
 ):
     """Mark all messages in conversation as read"""
     await chat_service.mark_messages_as_read(conversation_id, current_user.id)
@@ -61,7 +61,7 @@ async def mark_conversation_read(
 
 @router.get("/online-users")
 async def get_online_users(
-    current_user: UserResponse = Depends(get_current_user)
+    current_user: UserIdentity = Depends(get_current_user)
 ):
     """Get list of online users"""
     from app.services.connection_manager import connection_manager
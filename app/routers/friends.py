@@ -2,24 +2,36 @@ from fastapi import APIRouter, Depends, HTTPException, status, Query
 from typing import List, Optional
 from app.models.friendship import Friendship, FriendRequest, UserProfile, FriendshipStatus
 from app.database import get_database
-from app.routers.auth import get_current_user
-from app.models.user import UserResponse
+from app.routers.auth import get_current_user, get_current_user_profile
+from app.models.user import UserIdentity, UserResponse
 from app.services.connection_manager import connection_manager
+from app.repositories.friendship_repository import friendship_repository, other_user_id
+from app.repositories.user_repository import user_repository
 from bson import ObjectId
+from pymongo import ASCENDING, IndexModel
+from app.utils.indexes import declare_indexes
 from datetime import datetime
 
 router = APIRouter(prefix="/friends", tags=["friends"])
 
+declare_indexes(
+    "friendships",
+    # One friendship per direction; also serves the pair lookups below
+    IndexModel([("requester_id", ASCENDING), ("addressee_id", ASCENDING)], unique=True),
+    IndexModel([("requester_id", ASCENDING), ("status", ASCENDING)]),
+    IndexModel([("addressee_id", ASCENDING), ("status", ASCENDING)])
+)
+
 @router.post("/request")
 async def send_friend_request(
     friend_request: FriendRequest,
-    current_user: UserResponse = Depends(get_current_user)
+    current_user: UserResponse = Depends(get_current_user_profile)
 ):
     """Send a friend request"""
     db = await get_database()
     
     # Find target user
-    target_user = await db.users.find_one({"username": friend_request.addressee_username})
+    target_user = await user_repository.find_by_username(friend_request.addressee_username, "id")
     if not target_user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -75,7 +87,7 @@ async def send_friend_request(
 async def respond_to_friend_request(
     friendship_id: str,
     accept: bool,
-    current_user: UserResponse = Depends(get_current_user)
+    current_user: UserResponse = Depends(get_current_user_profile)
 ):
     """Accept or decline a friend request"""
     db = await get_database()
@@ -118,132 +130,88 @@ async def respond_to_friend_request(
         "timestamp": datetime.utcnow().isoformat()
     }
     
+    await connection_manager.invalidate_friends(current_user.id, friendship["requester_id"])
     await connection_manager.send_personal_message(friendship["requester_id"], notification)
     
     return {"status": "accepted" if accept else "declined"}
 
 @router.get("/", response_model=List[UserProfile])
 async def get_friends(
-    current_user: UserResponse = Depends(get_current_user)
+    current_user: UserIdentity = Depends(get_current_user)
 ):
     """Get user's friends list"""
-    db = await get_database()
-    
     friends = []
     
-    # Find accepted friendships
-    cursor = db.friendships.find({
-        "$or": [
-            {"requester_id": current_user.id, "status": FriendshipStatus.ACCEPTED},
-            {"addressee_id": current_user.id, "status": FriendshipStatus.ACCEPTED}
-        ]
-    })
-    
-    async for friendship in cursor:
-        # Determine friend's ID
-        friend_id = (friendship["addressee_id"] 
-                    if friendship["requester_id"] == current_user.id 
-                    else friendship["requester_id"])
-        
-        # Get friend's details
-        friend = await db.users.find_one({"_id": ObjectId(friend_id)})
-        if friend:
-            # Check online status
-            is_online = await connection_manager.is_user_online(friend_id)
-            
-            friend_profile = UserProfile(
-                id=str(friend["_id"]),
-                username=friend["username"],
-                full_name=friend.get("full_name"),
-                quantum_level=friend.get("quantum_level", 1),
-                is_online=is_online,
-                last_seen=friend.get("last_login")
-            )
-            friends.append(friend_profile)
+    # Accepted friendships, then every friend's profile in one query
+    friend_ids = await friendship_repository.friend_ids(current_user.id)
+    friend_docs = await user_repository.get_many(friend_ids, "profile")
+    
+    # Check online status for all friends in one round trip
+    online_statuses = await connection_manager.get_online_statuses(list(friend_docs))
+    
+    for friend_id in friend_ids:
+        friend = friend_docs.get(friend_id)
+        if not friend:
+            continue
+        friend_profile = UserProfile(
+            id=friend_id,
+            username=friend["username"],
+            full_name=friend.get("full_name"),
+            quantum_level=friend.get("quantum_level", 1),
+            is_online=online_statuses[friend_id],
+            last_seen=friend.get("last_login")
+        )
+        friends.append(friend_profile)
     
     return friends
 
 @router.get("/requests")
 async def get_friend_requests(
-    current_user: UserResponse = Depends(get_current_user)
+    current_user: UserIdentity = Depends(get_current_user)
 ):
     """Get pending friend requests"""
-    db = await get_database()
-    
-    requests = []
-    
-    # Get incoming requests
-    incoming_cursor = db.friendships.find({
-        "addressee_id": current_user.id,
-        "status": FriendshipStatus.PENDING
-    })
-    
-    async for request in incoming_cursor:
-        requester = await db.users.find_one({"_id": ObjectId(request["requester_id"])})
-        if requester:
-            requests.append({
-                "id": str(request["_id"]),
-                "type": "incoming",
-                "user": {
-                    "id": str(requester["_id"]),
-                    "username": requester["username"],
-                    "full_name": requester.get("full_name")
-                },
-                "created_at": request["created_at"]
-            })
-    
-    # Get sent requests
-    outgoing_cursor = db.friendships.find({
-        "requester_id": current_user.id,
-        "status": FriendshipStatus.PENDING
-    })
+    pending = await friendship_repository.pending(current_user.id)
+    users = await user_repository.get_many(
+        [other_user_id(request, current_user.id) for request in pending], "summary"
+    )
     
-    async for request in outgoing_cursor:
-        addressee = await db.users.find_one({"_id": ObjectId(request["addressee_id"])})
-        if addressee:
-            requests.append({
-                "id": str(request["_id"]),
-                "type": "outgoing",
-                "user": {
-                    "id": str(addressee["_id"]),
-                    "username": addressee["username"],
-                    "full_name": addressee.get("full_name")
-                },
-                "created_at": request["created_at"]
-            })
+    incoming = []
+    outgoing = []
+    for request in pending:
+        user = users.get(other_user_id(request, current_user.id))
+        if not user:
+            continue
+        is_incoming = request["addressee_id"] == current_user.id
+        (incoming if is_incoming else outgoing).append({
+            "id": str(request["_id"]),
+            "type": "incoming" if is_incoming else "outgoing",
+            "user": {
+                "id": str(user["_id"]),
+                "username": user["username"],
+                "full_name": user.get("full_name")
+            },
+            "created_at": request["created_at"]
+        })
     
-    return {"friend_requests": requests}
+    return {"friend_requests": incoming + outgoing}
 
 @router.get("/search")
 async def search_users(
     query: str = Query(..., min_length=2),
-    current_user: UserResponse = Depends(get_current_user)
+    current_user: UserIdentity = Depends(get_current_user)
 ):
     """Search for users to befriend"""
-    db = await get_database()
+    # Search users by username or full name, excluding self
+    matches = await user_repository.search(query, current_user.id, "profile", limit=20)
     
-    # Search users by username or full name
-    search_cursor = db.users.find({
-        "$and": [
-            {"_id": {"$ne": ObjectId(current_user.id)}},  # Exclude self
-            {
-                "$or": [
-                    {"username": {"$regex": query, "$options": "i"}},
-                    {"full_name": {"$regex": query, "$options": "i"}}
-                ]
-            }
-        ]
-    }).limit(20)
+    # Friendship status for every result in one query
+    friendships = await friendship_repository.between(
+        current_user.id, [str(user["_id"]) for user in matches]
+    )
     
     users = []
-    async for user in search_cursor:
-        # Check friendship status
-        friendship = await db.friendships.find_one({
-            "$or": [
-                {"requester_id": current_user.id, "addressee_id": str(user["_id"])},
-                {"requester_id": str(user["_id"]), "addressee_id": current_user.id}
-            ]
-        })
+    for user in matches:
+        friendship = friendships.get(str(user["_id"]))
         
         friendship_status = "none"
         if friendship:
@@ -262,16 +230,20 @@ async def search_users(
             "username": user["username"],
             "full_name": user.get("full_name"),
             "quantum_level": user.get("quantum_level", 1),
-            "friendship_status": friendship_status,
-            "is_online": await connection_manager.is_user_online(str(user["_id"]))
+            "friendship_status": friendship_status
         })
     
+    # Check online status for all results in one round trip
+    online_statuses = await connection_manager.get_online_statuses([u["id"] for u in users])
+    for u in users:
+        u["is_online"] = online_statuses[u["id"]]
+    
     return {"users": users}
 
 @router.delete("/{friend_id}")
 async def remove_friend(
     friend_id: str,
-    current_user: UserResponse = Depends(get_current_user)
+    current_user: UserIdentity = Depends(get_current_user)
 ):
     """Remove a friend"""
     db = await get_database()
@@ -290,4 +262,6 @@ async def remove_friend(
             detail="Friendship not found"
         )
     
+    await connection_manager.invalidate_friends(current_user.id, friend_id)
+    
     return {"status": "removed"}
@@ -2,7 +2,7 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from pydantic import BaseModel
 from typing import Optional, Dict, Any
 from app.routers.auth import get_current_user
-from app.models.user import UserResponse
+from app.models.user import UserIdentity
 
 # If you have a quantum_service, import it here
 # from app.services.quantum_service import quantum_service
@@ -32,7 +32,7 @@ class ExecuteResponse(BaseModel):
 @router.post("/analyze", response_model=AnalyzeResponse)
 async def analyze_circuit(
     request: AnalyzeRequest,
-    current_user: UserResponse = Depends(get_current_user)
+    current_user: UserIdentity = Depends(get_current_user)
 ):
     """
     Analyze a quantum circuit (QASM) and return metadata.
@@ -53,7 +53,7 @@ async def analyze_circuit(
 @router.post("/execute", response_model=ExecuteResponse)
 async def execute_circuit(
     request: ExecuteRequest,
-    current_user: UserResponse = Depends(get_current_user)
+    current_user: UserIdentity = Depends(get_current_user)
 ):
     """
     Execute a quantum circuit (QASM) and return measurement results.
@@ -2,7 +2,7 @@ from fastapi import APIRouter, Depends
 from typing import Dict, Any
 from app.models.settings import UserSetting
 from app.routers.auth import get_current_user
-from app.models.user import UserResponse
+from app.models.user import UserIdentity
 from app.database import get_database
 from bson import ObjectId
 from datetime import datetime
@@ -12,7 +12,7 @@ import ast
 router = APIRouter(prefix="/settings", tags=["settings"])
 
 @router.get("/")
-async def get_settings(current_user: UserResponse = Depends(get_current_user)):
+async def get_settings(current_user: UserIdentity = Depends(get_current_user)):
     db = await get_database()
     settings = {}
     async for s in db.configuration_settings.find({"user_id": current_user.id}):
@@ -22,7 +22,7 @@ async def get_settings(current_user: UserResponse = Depends(get_current_user)):
 @router.post("/")
 async def update_setting(
     key: str, value: Any,
-    current_user: UserResponse = Depends(get_current_user)
+    current_user: UserIdentity = Depends(get_current_user)
 ):
     db = await get_database()
     await db.configuration_settings.update_one(
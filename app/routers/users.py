@@ -1,9 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
 from typing import List, Optional
 from app.database import get_database
-from app.routers.auth import get_current_user
-from app.models.user import UserResponse
+from app.routers.auth import get_current_user, get_current_user_profile
+from app.services.auth_service import auth_service
+from app.models.user import UserIdentity, UserResponse
 from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from app.utils.indexes import declare_indexes
 from datetime import datetime
 import os
 import shutil
@@ -12,9 +15,19 @@ import uuid
 
 router = APIRouter(prefix="/users", tags=["users"])
 
+declare_indexes(
+    "quantum_circuits",
+    IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING)])
+)
+declare_indexes(
+    "chat_messages",
+    # Message counts and recent activity by sender
+    IndexModel([("sender_id", ASCENDING), ("timestamp", DESCENDING)])
+)
+
 @router.get("/profile", response_model=UserResponse)
 async def get_user_profile(
-    current_user: UserResponse = Depends(get_current_user)
+    current_user: UserResponse = Depends(get_current_user_profile)
 ):
     """Get current user's profile"""
     return current_user
@@ -22,7 +35,7 @@ async def get_user_profile(
 @router.put("/profile")
 async def update_user_profile(
     full_name: Optional[str] = Form(None),
-    current_user: UserResponse = Depends(get_current_user)
+    current_user: UserIdentity = Depends(get_current_user)
 ):
     """Update user profile"""
     db = await get_database()
@@ -37,13 +50,14 @@ async def update_user_profile(
             {"_id": ObjectId(current_user.id)},
             {"$set": update_data}
         )
+        await auth_service.invalidate_user(current_user.id)
     
     return {"status": "updated"}
 
 @router.post("/avatar")
 async def upload_avatar(
     avatar: UploadFile = File(...),
-    current_user: UserResponse = Depends(get_current_user)
+    current_user: UserIdentity = Depends(get_current_user)
 ):
     """Upload user avatar"""
     # Validate file type
@@ -84,12 +98,13 @@ async def upload_avatar(
         {"_id": ObjectId(current_user.id)},
         {"$set": {"avatar_path": file_path, "updated_at": datetime.utcnow()}}
     )
+    await auth_service.invalidate_user(current_user.id)
     
     return {"avatar_url": f"/static/avatars/{filename}"}
 
 @router.get("/stats")
 async def get_user_stats(
-    current_user: UserResponse = Depends(get_current_user)
+    current_user: UserIdentity = Depends(get_current_user)
 ):
     """Get user statistics"""
     db = await get_database()
@@ -128,7 +143,7 @@ async def get_user_stats(
 @router.get("/activity")
 async def get_user_activity(
     limit: int = 20,
-    current_user: UserResponse = Depends(get_current_user)
+    current_user: UserIdentity = Depends(get_current_user)
 ):
     """Get user's recent activity"""
     db = await get_database()
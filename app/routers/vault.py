@@ -2,19 +2,28 @@ from fastapi import APIRouter, Depends, HTTPException, status, Query
 from typing import List, Optional
 from app.database import get_database
 from app.routers.auth import get_current_user
-from app.models.user import UserResponse
+from app.models.user import UserIdentity
 from app.services.permission_service import permission_service
 from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from app.utils.indexes import declare_indexes
 from datetime import datetime, timedelta
 
 router = APIRouter(prefix="/vault", tags=["quantum-vault"])
 
+declare_indexes(
+    "quantum_vault_items",
+    # Item listings, with and without a category filter, newest first
+    IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING)]),
+    IndexModel([("user_id", ASCENDING), ("item_type", ASCENDING), ("created_at", DESCENDING)])
+)
+
 @router.get("/items")
 async def get_vault_items(
     category: Optional[str] = Query(None),
     limit: int = Query(50, le=100),
     offset: int = Query(0, ge=0),
-    current_user: UserResponse = Depends(get_current_user)
+    current_user: UserIdentity = Depends(get_current_user)
 ):
     """Get items from quantum vault"""
     db = await get_database()
@@ -44,7 +53,7 @@ async def store_vault_item(
     item_type: str,
     item_data: dict,
     access_permissions: List[str] = [],
-    current_user: UserResponse = Depends(get_current_user)
+    current_user: UserIdentity = Depends(get_current_user)
 ):
     """Store item in quantum vault"""
     db = await get_database()
@@ -64,7 +73,7 @@ async def store_vault_item(
 
 @router.get("/analytics")
 async def get_vault_analytics(
-    current_user: UserResponse = Depends(get_current_user)
+    current_user: UserIdentity = Depends(get_current_user)
 ):
     """Get vault analytics and insights"""
     db = await get_database()
@@ -97,7 +106,7 @@ async def get_vault_analytics(
 @router.delete("/items/{item_id}")
 async def delete_vault_item(
     item_id: str,
-    current_user: UserResponse = Depends(get_current_user)
+    current_user: UserIdentity = Depends(get_current_user)
 ):
     """Delete item from vault"""
     db = await get_database()
@@ -1,9 +1,11 @@
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends, Query
+from typing import Optional
 from app.services.connection_manager import connection_manager
+from app.services.presence_service import presence_service
+from app.services.conversation_channels import conversation_channels
+from app.utils.frames import decode_inbound
 from app.utils.security import verify_token
-from app.utils.redis_client import redis_client
-import asyncio
-import json
+from app.services.auth_service import JWT_CLAIMS_MODE, auth_service
 import logging
 
 logger = logging.getLogger(__name__)
@@ -22,6 +24,11 @@ async def get_current_user_ws(websocket: WebSocket, token: str = Query(...)):
             await websocket.close(code=1008)
             return None
         
+        # Same revocation check as HTTP requests make for claims-bearing tokens
+        if JWT_CLAIMS_MODE and "ver" in payload and await auth_service.user_from_claims(payload) is None:
+            await websocket.close(code=1008)
+            return None
+        
         return user_id
     except Exception as e:
         logger.error(f"WebSocket authentication error: {e}")
@@ -29,29 +36,22 @@ async def get_current_user_ws(websocket: WebSocket, token: str = Query(...)):
         return None
 
 @router.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket, token: str = Query(...)):
+async def websocket_endpoint(
+    websocket: WebSocket,
+    token: str = Query(...),
+    last_event_id: Optional[str] = Query(None)
+):
     """Main WebSocket endpoint for real-time communication"""
     user_id = await get_current_user_ws(websocket, token)
     if not user_id:
         return
     
-    await connection_manager.connect(websocket, user_id)
+    # Clients pass the last event_id they saw to receive only what they missed
+    await connection_manager.connect(websocket, user_id, last_event_id)
     
     try:
-        # Start Redis message listener task
-        redis_task = asyncio.create_task(redis_message_listener(websocket, user_id))
-        websocket_task = asyncio.create_task(websocket_message_handler(websocket, user_id))
-        
-        # Wait for either task to complete
-        done, pending = await asyncio.wait(
-            [redis_task, websocket_task],
-            return_when=asyncio.FIRST_COMPLETED
-        )
-        
-        # Cancel remaining tasks
-        for task in pending:
-            task.cancel()
-    
+        # Outbound Redis messages are routed to this socket by the process-wide dispatcher
+        await websocket_message_handler(websocket, user_id)
     except WebSocketDisconnect:
         logger.info(f"WebSocket disconnected for user {user_id}")
     except Exception as e:
@@ -59,29 +59,37 @@ async def websocket_endpoint(websocket: WebSocket, token: str = Query(...)):
     finally:
         await connection_manager.disconnect(websocket, user_id)
 
-async def redis_message_listener(websocket: WebSocket, user_id: str):
-    """Listen for Redis pub/sub messages and forward to WebSocket"""
-    try:
-        while True:
-            message = await redis_client.get_message()
-            if message:
-                await websocket.send_text(json.dumps(message))
-            await asyncio.sleep(0.01)  # Small delay to prevent busy waiting
-    except Exception as e:
-        logger.error(f"Redis listener error for user {user_id}: {e}")
+@router.get("/ws/stats")
+async def websocket_stats():
+    """Real-time delivery counters for this process"""
+    return {
+        "active_users": len(connection_manager.active_connections),
+        "active_connections": len(connection_manager.outbound_queues),
+        "dispatcher": connection_manager.dispatcher.get_stats(),
+        "presence": connection_manager.status_debouncer.get_stats(),
+        "typing": connection_manager.typing_coalescer.get_stats(),
+        "conversation_channels": conversation_channels.get_stats(),
+        "connections": connection_manager.get_connection_stats()
+    }
 
 async def websocket_message_handler(websocket: WebSocket, user_id: str):
     """Handle incoming WebSocket messages"""
     try:
         while True:
-            data = await websocket.receive_text()
-            message = json.loads(data)
+            data = await websocket.receive()
+            if data["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(data.get("code", 1000))
+            # JSON text frames, or MessagePack binary frames on the msgpack subprotocol
+            message = decode_inbound(data.get("text"), data.get("bytes"))
+            
+            # Any inbound frame counts as a presence heartbeat
+            await presence_service.touch(user_id)
             
             # Handle different message types
             message_type = message.get("type")
             
             if message_type == "ping":
-                await websocket.send_text(json.dumps({"type": "pong"}))
+                connection_manager.send_to_socket(websocket, {"type": "pong"})
             elif message_type == "typing":
                 await handle_typing_indicator(user_id, message)
             elif message_type == "mark_read":
@@ -96,16 +104,11 @@ async def handle_typing_indicator(user_id: str, message: dict):
     """Handle typing indicator"""
     conversation_id = message.get("conversation_id")
     if conversation_id:
-        typing_data = {
-            "type": "typing_indicator",
-            "user_id": user_id,
-            "conversation_id": conversation_id,
-            "is_typing": message.get("is_typing", True)
-        }
-        await connection_manager.send_to_conversation(
+        # Coalesced per (user, conversation); "stopped" is sent when frames stop arriving
+        await connection_manager.typing_coalescer.typing(
+            user_id,
             conversation_id,
-            typing_data,
-            exclude_user=user_id
+            bool(message.get("is_typing", True))
         )
 
 async def handle_mark_read(user_id: str, message: dict):
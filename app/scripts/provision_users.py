@@ -0,0 +1,71 @@
+"""Bulk-provision users from a CSV or JSON Lines file.
+
+    python -m app.scripts.provision_users users.csv --output results.csv
+
+Rows need username, email and password; full_name is optional. Passwords are
+hashed in parallel and users are written with unordered insert_many, so
+duplicates and invalid rows are reported per row without stopping the import.
+"""
+import argparse
+import asyncio
+import csv
+import json
+import os
+import sys
+import time
+from typing import Iterator
+
+from app.services.auth_service import BULK_INSERT_CHUNK_SIZE, AuthService
+
+RESULT_FIELDS = ["index", "username", "email", "status", "id", "detail"]
+
+
+def read_rows(path: str) -> Iterator[dict]:
+    with open(path, newline="", encoding="utf-8") as source:
+        if path.endswith((".jsonl", ".ndjson")):
+            for line in source:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from csv.DictReader(source)
+
+
+async def provision(args) -> int:
+    started = time.perf_counter()
+    # This process does nothing else, so hashing may use every core
+    results = await AuthService().bulk_provision(
+        list(read_rows(args.source)),
+        chunk_size=args.chunk_size,
+        hash_workers=args.hash_workers or os.cpu_count() or 1
+    )
+
+    out = open(args.output, "w", newline="", encoding="utf-8") if args.output else sys.stdout
+    try:
+        writer = csv.DictWriter(out, fieldnames=RESULT_FIELDS)
+        writer.writeheader()
+        for result in results:
+            writer.writerow(result.dict())
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    counts = {}
+    for result in results:
+        counts[result.status] = counts.get(result.status, 0) + 1
+    elapsed = time.perf_counter() - started
+    summary = ", ".join(f"{status}: {count}" for status, count in sorted(counts.items()))
+    print(f"Processed {len(results)} rows in {elapsed:.1f}s ({summary})", file=sys.stderr)
+    return 0 if counts.get("created", 0) == len(results) else 1
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("source", help="CSV file, or .jsonl/.ndjson file, of users")
+    parser.add_argument("--output", help="write per-row results as CSV here instead of stdout")
+    parser.add_argument("--chunk-size", type=int, default=BULK_INSERT_CHUNK_SIZE, help="rows per insert_many")
+    parser.add_argument("--hash-workers", type=int, default=None, help="parallel bcrypt threads (default: CPU count)")
+    return asyncio.run(provision(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,14 +1,65 @@
-from app.models.user import User, UserCreate, UserResponse
-from app.utils.security import get_password_hash, verify_password
+from app.models.user import BulkUserResult, User, UserCreate, UserIdentity, UserResponse
+from app.utils.password_pool import PasswordPoolOverloaded, password_pool
 from app.database import get_database
+from app.repositories.user_repository import user_repository
+from app.services.cluster_events import cluster_events
+from app.utils.redis_client import redis_client
+from app.utils.ttl_cache import TTLCache
+from app.utils.indexes import declare_indexes
 from datetime import datetime
-from typing import Optional
+from typing import Iterable, List, Optional, Tuple, Union
 from bson import ObjectId
+from pymongo import ASCENDING, IndexModel, ReturnDocument
+from pymongo.errors import BulkWriteError
+from pydantic import ValidationError
 import logging
+import os
 import traceback
 
 logger = logging.getLogger(__name__)
 
+# user_id -> UserResponse, shared by every AuthService in the process
+_user_cache = TTLCache(
+    maxsize=int(os.getenv("USER_CACHE_SIZE", 10000)),
+    ttl=float(os.getenv("USER_CACHE_TTL", 30))
+)
+
+# Tokens carry the stable profile fields so requests can skip the user lookup
+JWT_CLAIMS_MODE = os.getenv("JWT_CLAIMS_MODE", "false").lower() in ("1", "true", "yes")
+
+# Mirror of users.token_version, checked on every claims-bearing request
+TOKEN_VERSION_KEY_PREFIX = "token_version:"
+TOKEN_VERSION_REDIS_TTL = int(os.getenv("TOKEN_VERSION_REDIS_TTL", 86400))
+_token_versions = TTLCache(
+    maxsize=int(os.getenv("TOKEN_VERSION_CACHE_SIZE", 50000)),
+    ttl=float(os.getenv("TOKEN_VERSION_CACHE_TTL", 30))
+)
+
+# Rows hashed and written per insert_many during bulk provisioning
+BULK_INSERT_CHUNK_SIZE = int(os.getenv("BULK_INSERT_CHUNK_SIZE", 1000))
+DUPLICATE_KEY_ERROR = 11000
+
+def _text(value) -> Optional[str]:
+    return value if isinstance(value, str) else None
+
+def parse_user_rows(rows: Iterable[dict]) -> Tuple[List[Tuple[int, UserCreate]], List[BulkUserResult]]:
+    """Split rows into valid users (with their row index) and results for invalid rows"""
+    valid = []
+    invalid = []
+    for index, row in enumerate(rows):
+        try:
+            valid.append((index, UserCreate(**{key: value for key, value in row.items() if value not in (None, "")})))
+        except ValidationError as e:
+            invalid.append(BulkUserResult(
+                index=index,
+                # Echoed back only when they are strings; a wrong type is what made the row invalid
+                username=_text(row.get("username")),
+                email=_text(row.get("email")),
+                status="invalid",
+                detail="; ".join(f"{'.'.join(map(str, error['loc']))}: {error['msg']}" for error in e.errors())
+            ))
+    return valid, invalid
+
 class AuthService:
     def __init__(self):
         self.collection_name = "users"
@@ -25,7 +76,7 @@ class AuthService:
             if existing_user:
                 raise ValueError("User already exists")
 
-            hashed_password = get_password_hash(user_data.password)
+            hashed_password = await password_pool.hash(user_data.password)
             user_dict = {
                 "username": user_data.username,
                 "email": user_data.email,
@@ -36,7 +87,8 @@ class AuthService:
                 "quantum_level": 1,
                 "total_capsules": 0,
                 "unlocked_capsules": 0,
-                "quantum_connections": []
+                "quantum_connections": [],
+                "token_version": 0
             }
             result = await db[self.collection_name].insert_one(user_dict)
             return UserResponse(
@@ -49,33 +101,107 @@ class AuthService:
                 total_capsules=user_dict["total_capsules"],
                 unlocked_capsules=user_dict["unlocked_capsules"]
             )
+        except PasswordPoolOverloaded:
+            raise
         except Exception:
             logger.error(traceback.format_exc())
             raise ValueError("Failed to create user")
 
-    async def authenticate_user(self, username: str, password: str) -> Optional[User]:
+    async def bulk_provision(
+        self,
+        rows: List[dict],
+        chunk_size: int = BULK_INSERT_CHUNK_SIZE,
+        hash_workers: Optional[int] = None
+    ) -> List[BulkUserResult]:
+        """Validate raw rows individually and create the valid ones; results are in row order"""
+        valid, results = parse_user_rows(rows)
+        created = await self.bulk_create_users(
+            [user for _, user in valid],
+            chunk_size=chunk_size,
+            hash_workers=hash_workers
+        )
+        for (row_index, _), result in zip(valid, created):
+            result.index = row_index
+            results.append(result)
+        results.sort(key=lambda result: result.index)
+        return results
+
+    async def bulk_create_users(
+        self,
+        users: List[UserCreate],
+        chunk_size: int = BULK_INSERT_CHUNK_SIZE,
+        hash_workers: Optional[int] = None
+    ) -> List[BulkUserResult]:
+        """Create many users, relying on the unique email/username indexes instead of pre-checks"""
         db = await get_database()
+        results: List[BulkUserResult] = []
+        for start in range(0, len(users), chunk_size):
+            chunk = users[start:start + chunk_size]
+            hashed_passwords = await password_pool.hash_many([user.password for user in chunk], hash_workers)
+
+            now = datetime.utcnow()
+            documents = [
+                {
+                    "username": user.username,
+                    "email": user.email,
+                    "full_name": user.full_name,
+                    "hashed_password": hashed_password,
+                    "is_active": True,
+                    "created_at": now,
+                    "quantum_level": 1,
+                    "total_capsules": 0,
+                    "unlocked_capsules": 0,
+                    "quantum_connections": [],
+                    "token_version": 0
+                }
+                for user, hashed_password in zip(chunk, hashed_passwords)
+            ]
+
+            write_errors = {}
+            try:
+                # Unordered so one bad row does not stop the rest of the chunk
+                await db[self.collection_name].insert_many(documents, ordered=False)
+            except BulkWriteError as e:
+                write_errors = {error["index"]: error for error in e.details.get("writeErrors", [])}
+
+            for offset, (user, document) in enumerate(zip(chunk, documents)):
+                result = BulkUserResult(index=start + offset, username=user.username, email=user.email, status="created")
+                error = write_errors.get(offset)
+                if error is None:
+                    result.id = str(document["_id"])
+                elif error.get("code") == DUPLICATE_KEY_ERROR:
+                    fields = ", ".join(error.get("keyValue", {})) or "username or email"
+                    result.status = "duplicate"
+                    result.detail = f"Duplicate {fields}"
+                else:
+                    result.status = "error"
+                    result.detail = error.get("errmsg")
+                results.append(result)
+        return results
+
+    async def authenticate_user(self, username: str, password: str) -> Optional[User]:
         try:
-            user = await db[self.collection_name].find_one({
-                "$or": [
-                    {"username": username},
-                    {"email": username}
-                ]
-            })
-            if not user or not verify_password(password, user["hashed_password"]):
+            user = await user_repository.find_by_login(username, "auth")
+            if not user or not await password_pool.verify(password, user["hashed_password"]):
                 return None
             user["id"] = str(user["_id"])
             return User(**user)
+        except PasswordPoolOverloaded:
+            raise
         except Exception:
             logger.error(traceback.format_exc())
             return None
 
     async def get_current_user(self, user_id: str) -> Optional[UserResponse]:
-        db = await get_database()
+        cached = _user_cache.get(user_id)
+        if cached is not None:
+            # Concurrent requests share the cached instance, so each gets its own copy
+            return cached.model_copy()
+
         try:
-            user = await db[self.collection_name].find_one({"_id": ObjectId(user_id)})
+            user = await user_repository.get(user_id, "response")
             if user:
-                return UserResponse(
+                user_response = UserResponse(
                     id=str(user["_id"]),
                     username=user["username"],
                     email=user["email"],
@@ -85,7 +211,93 @@ class AuthService:
                     total_capsules=user["total_capsules"],
                     unlocked_capsules=user["unlocked_capsules"]
                 )
+                _user_cache.set(user_id, user_response)
+                return user_response.model_copy()
             return None
         except Exception:
             logger.error(traceback.format_exc())
             return None
+
+    async def invalidate_user(self, user_id: str):
+        """Drop the cached user on every node after the user document changes"""
+        await cluster_events.publish("user_changed", {"user_id": user_id})
+
+    def token_claims(self, user: Union[User, UserIdentity], token_version: int = 0) -> dict:
+        """Claims for a claims-bearing access token"""
+        return {
+            "sub": str(user.id),
+            "username": user.username,
+            "email": user.email,
+            "quantum_level": user.quantum_level,
+            "is_active": user.is_active,
+            "ver": token_version
+        }
+
+    async def user_from_claims(self, payload: dict) -> Optional[UserIdentity]:
+        """Build the user from token claims, or None if the token was revoked"""
+        user_id = payload["sub"]
+        if payload.get("ver", 0) < await self.get_token_version(user_id):
+            return None
+        # Counters change too often to be carried in a token; get_current_user reads them
+        return UserIdentity(
+            id=user_id,
+            username=payload["username"],
+            email=payload["email"],
+            is_active=payload["is_active"],
+            quantum_level=payload["quantum_level"]
+        )
+
+    async def get_token_version(self, user_id: str) -> int:
+        """Current token version, from the local cache, then Redis, then Mongo"""
+        version = _token_versions.get(user_id)
+        if version is not None:
+            return version
+
+        key = f"{TOKEN_VERSION_KEY_PREFIX}{user_id}"
+        value = await redis_client.get(key)
+        if value is not None:
+            version = int(value)
+        else:
+            db = await get_database()
+            user = await db[self.collection_name].find_one(
+                {"_id": ObjectId(user_id)},
+                {"token_version": 1}
+            )
+            version = user.get("token_version", 0) if user else 0
+            await redis_client.set(key, str(version), ttl=TOKEN_VERSION_REDIS_TTL)
+
+        _token_versions.set(user_id, version)
+        return version
+
+    async def revoke_tokens(self, user_id: str) -> int:
+        """Invalidate every claims-bearing token issued to the user so far"""
+        db = await get_database()
+        user = await db[self.collection_name].find_one_and_update(
+            {"_id": ObjectId(user_id)},
+            {"$inc": {"token_version": 1}},
+            projection={"token_version": 1},
+            return_document=ReturnDocument.AFTER
+        )
+        if user is None:
+            raise ValueError("User not found")
+
+        version = user["token_version"]
+        await redis_client.set(f"{TOKEN_VERSION_KEY_PREFIX}{user_id}", str(version), ttl=TOKEN_VERSION_REDIS_TTL)
+        await cluster_events.publish("tokens_revoked", {"user_id": user_id, "token_version": version})
+        return version
+
+# Global auth service instance
+auth_service = AuthService()
+
+declare_indexes(
+    "users",
+    # Login and bulk provisioning rely on these for duplicate detection
+    IndexModel([("email", ASCENDING)], unique=True),
+    IndexModel([("username", ASCENDING)], unique=True)
+)
+
+cluster_events.register("user_changed", lambda data: _user_cache.invalidate(data["user_id"]))
+cluster_events.register(
+    "tokens_revoked",
+    lambda data: _token_versions.set(data["user_id"], data["token_version"])
+)
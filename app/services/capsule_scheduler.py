@@ -0,0 +1,244 @@
+from app.database import get_database
+from app.models.capsule import CapsuleStatus
+from app.services.auth_service import auth_service
+from app.services.connection_manager import connection_manager
+from app.utils.indexes import declare_indexes
+from app.utils.query_metrics import start_background_task
+from bson import ObjectId
+from datetime import datetime, timedelta, timezone
+from pymongo import ASCENDING, IndexModel
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import heapq
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# Locked capsules due within this many seconds are held in memory
+CAPSULE_UNLOCK_HORIZON = float(os.getenv("CAPSULE_UNLOCK_HORIZON", 3600))
+# Capsules loaded per refill query
+CAPSULE_UNLOCK_BATCH_SIZE = int(os.getenv("CAPSULE_UNLOCK_BATCH_SIZE", 1000))
+
+# (unlock_date, capsule_id, user_id)
+ScheduledUnlock = Tuple[datetime, str, str]
+
+def _utc_naive(value: datetime) -> datetime:
+    """Stored dates are naive UTC; request bodies may carry an offset"""
+    if value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+class CapsuleUnlockScheduler:
+    """Unlocks capsules when their unlock_date passes, from a min-heap of the ones due soon"""
+
+    def __init__(self, horizon: float = CAPSULE_UNLOCK_HORIZON, batch_size: int = CAPSULE_UNLOCK_BATCH_SIZE):
+        self.horizon = timedelta(seconds=horizon)
+        self.batch_size = batch_size
+        self._heap: List[ScheduledUnlock] = []
+        # capsule_id -> unlock_date of its live heap entry; older entries are skipped when popped
+        self._scheduled: Dict[str, datetime] = {}
+        # Every locked capsule due up to here has been loaded
+        self._loaded_until: Optional[datetime] = None
+        # Set while a refill is part way through capsules due at _loaded_until; ones after this id are not loaded
+        self._loaded_after_id: Optional[ObjectId] = None
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+        # Counters
+        self.unlocked = 0
+        self.runs = 0
+        self.refills = 0
+        self.max_lag = 0.0
+
+    def ensure_started(self):
+        if self._task is None or self._task.done():
+            self._task = start_background_task(self._run_loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def schedule(self, capsule_id: str, user_id: str, unlock_date: datetime):
+        """Track a created or rescheduled capsule; ones beyond the loaded window are left to a refill"""
+        unlock_date = _utc_naive(unlock_date)
+        if self._loaded_until is None or unlock_date > self._loaded_until or (
+            unlock_date == self._loaded_until and self._loaded_after_id is not None
+            and ObjectId(capsule_id) > self._loaded_after_id
+        ):
+            self._scheduled.pop(capsule_id, None)
+            return
+        self._push(unlock_date, capsule_id, user_id)
+        if self._heap[0][1] == capsule_id:
+            self._wakeup.set()
+
+    def cancel(self, capsule_id: str):
+        self._scheduled.pop(capsule_id, None)
+
+    async def unlock_due(self, user_id: str) -> List[dict]:
+        """Unlock a user's capsules that are already due, e.g. when the scheduler has fallen behind"""
+        capsules = await self._unlock(user_id, {})
+        await self._notify([(user_id, capsules)])
+        return capsules
+
+    def _push(self, unlock_date: datetime, capsule_id: str, user_id: str):
+        if self._scheduled.get(capsule_id) == unlock_date:
+            return
+        self._scheduled[capsule_id] = unlock_date
+        heapq.heappush(self._heap, (unlock_date, capsule_id, user_id))
+
+    async def refill(self):
+        """Load locked capsules due before the end of the horizon, in (unlock_date, _id) order"""
+        self.refills += 1
+        until = datetime.utcnow() + self.horizon
+        query = {"status": CapsuleStatus.LOCKED, "unlock_date": {"$lte": until}}
+        if self._loaded_after_id is not None:
+            # Resume inside a run of capsules sharing one unlock_date
+            query["$or"] = [
+                {"unlock_date": {"$gt": self._loaded_until}},
+                {"unlock_date": self._loaded_until, "_id": {"$gt": self._loaded_after_id}}
+            ]
+        elif self._loaded_until is not None:
+            query["unlock_date"]["$gt"] = self._loaded_until
+
+        db = await get_database()
+        cursor = db.temporal_capsules.find(
+            query,
+            {"user_id": 1, "unlock_date": 1}
+        ).sort([("unlock_date", ASCENDING), ("_id", ASCENDING)]).limit(self.batch_size)
+        capsules = await cursor.to_list(length=self.batch_size)
+
+        for capsule in capsules:
+            self._push(capsule["unlock_date"], str(capsule["_id"]), capsule["user_id"])
+
+        if len(capsules) == self.batch_size:
+            # More may be due in the window; continue after the last one loaded
+            self._loaded_until = capsules[-1]["unlock_date"]
+            self._loaded_after_id = capsules[-1]["_id"]
+        else:
+            self._loaded_until = until
+            self._loaded_after_id = None
+
+    async def run_due(self):
+        """Unlock every heap entry whose date has passed, one bulk update per owner"""
+        now = datetime.utcnow()
+        due: Dict[str, List[ObjectId]] = {}
+        while self._heap and self._heap[0][0] <= now:
+            unlock_date, capsule_id, user_id = heapq.heappop(self._heap)
+            if self._scheduled.get(capsule_id) != unlock_date:
+                # Rescheduled or deleted since it was pushed
+                continue
+            del self._scheduled[capsule_id]
+            due.setdefault(user_id, []).append(ObjectId(capsule_id))
+            self.max_lag = max(self.max_lag, (now - unlock_date).total_seconds())
+        if not due:
+            return
+
+        self.runs += 1
+        unlocked = []
+        for user_id, capsule_ids in due.items():
+            try:
+                capsules = await self._unlock(user_id, {"_id": {"$in": capsule_ids}}, {"title": 1})
+                unlocked.append((user_id, capsules))
+            except Exception as e:
+                logger.error(f"Unlocking capsules for {user_id} failed: {e}")
+        await self._notify(unlocked)
+
+    async def _unlock(self, user_id: str, query: dict, projection: dict = None) -> List[dict]:
+        """Flip the user's due capsules matching query to unlocked and bump their counter"""
+        db = await get_database()
+        query = {
+            **query,
+            "user_id": user_id,
+            "status": CapsuleStatus.LOCKED,
+            "unlock_date": {"$lte": datetime.utcnow()}
+        }
+        capsules = await db.temporal_capsules.find(query, projection).to_list(length=None)
+        if not capsules:
+            return []
+
+        # One update per capsule tells which ones this call flipped; another node or
+        # the /unlockable read may have unlocked some meanwhile and notifies those itself
+        results = await asyncio.gather(*(
+            db.temporal_capsules.update_one(
+                {"_id": capsule["_id"], "status": CapsuleStatus.LOCKED},
+                {"$set": {"status": CapsuleStatus.UNLOCKED}}
+            )
+            for capsule in capsules
+        ))
+        capsules = [capsule for capsule, result in zip(capsules, results) if result.modified_count]
+        if not capsules:
+            # Another node got there first
+            return []
+
+        await db.users.update_one(
+            {"_id": ObjectId(user_id)},
+            {"$inc": {"unlocked_capsules": len(capsules)}}
+        )
+        await auth_service.invalidate_user(user_id)
+        self.unlocked += len(capsules)
+
+        for capsule in capsules:
+            capsule["status"] = CapsuleStatus.UNLOCKED
+        return capsules
+
+    async def _notify(self, unlocked: List[Tuple[str, List[dict]]]):
+        timestamp = datetime.utcnow().isoformat()
+        deliveries = [
+            ([user_id], {
+                "type": "capsule_unlocked",
+                "capsules": [{"id": str(capsule["_id"]), "title": capsule["title"]} for capsule in capsules],
+                "timestamp": timestamp
+            })
+            for user_id, capsules in unlocked if capsules
+        ]
+        if deliveries:
+            await connection_manager.send_batch(deliveries)
+
+    async def _run_loop(self):
+        while True:
+            try:
+                if self._loaded_until is None or datetime.utcnow() + self.horizon / 2 >= self._loaded_until:
+                    await self.refill()
+                await self.run_due()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Capsule unlock run failed: {e}")
+
+            # Sleep until the next unlock or refill, whichever is first
+            now = datetime.utcnow()
+            wake_at = self._loaded_until - self.horizon / 2 if self._loaded_until else now + self.horizon / 2
+            if self._heap:
+                wake_at = min(wake_at, self._heap[0][0])
+            timeout = min(max((wake_at - now).total_seconds(), 0.05), self.horizon.total_seconds() / 2)
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def get_stats(self) -> dict:
+        return {
+            "horizon": self.horizon.total_seconds(),
+            "scheduled": len(self._scheduled),
+            "next_unlock": self._heap[0][0].isoformat() if self._heap else None,
+            "loaded_until": self._loaded_until.isoformat() if self._loaded_until else None,
+            "unlocked": self.unlocked,
+            "runs": self.runs,
+            "refills": self.refills,
+            "max_lag_ms": self.max_lag * 1000
+        }
+
+capsule_scheduler = CapsuleUnlockScheduler()
+
+declare_indexes(
+    "temporal_capsules",
+    # Refills scan locked capsules in unlock order across all users
+    IndexModel([("status", ASCENDING), ("unlock_date", ASCENDING), ("_id", ASCENDING)])
+)
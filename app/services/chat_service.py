@@ -4,6 +4,8 @@ from app.services.connection_manager import connection_manager
 from bson import ObjectId
 from datetime import datetime
 from typing import List, Optional
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from app.utils.indexes import declare_indexes
 
 class ChatService:
     def __init__(self):
@@ -35,6 +37,10 @@ class ChatService:
         
         result = await db[self.db_name].insert_one(conversation_data)
         conversation_data["id"] = str(result.inserted_id)
+        connection_manager.cache_conversation(conversation_data["id"], participants)
+        if conversation_type != "private":
+            # Lets every node subscribe its connected members to the new group's channel
+            await connection_manager.invalidate_conversation(conversation_data["id"], participants)
         
         return Conversation(**conversation_data)
     
@@ -148,3 +154,14 @@ class ChatService:
         )
 
 chat_service = ChatService()
+
+declare_indexes(
+    "conversations",
+    # Conversation list for a user, newest activity first
+    IndexModel([("participants", ASCENDING), ("last_message_at", DESCENDING)])
+)
+declare_indexes(
+    "chat_messages",
+    IndexModel([("conversation_id", ASCENDING), ("timestamp", DESCENDING)]),
+    IndexModel([("sender_id", ASCENDING), ("timestamp", DESCENDING)])
+)
@@ -0,0 +1,46 @@
+from app.utils.redis_client import redis_client
+from app.services.routing_registry import NODE_ID, routing_registry
+from typing import Awaitable, Callable, Dict, List, Union
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+CLUSTER_CHANNEL = "cluster_events"
+
+Handler = Callable[[dict], Union[None, Awaitable[None]]]
+
+class ClusterEvents:
+    """Small control channel used to keep per-process state in sync across workers"""
+
+    def __init__(self):
+        self.channel = CLUSTER_CHANNEL
+        self._handlers: Dict[str, List[Handler]] = {}
+
+    def register(self, event: str, handler: Handler):
+        """Run handler for every occurrence of event, local or remote"""
+        self._handlers.setdefault(event, []).append(handler)
+
+    async def publish(self, event: str, data: dict):
+        """Apply an event locally and broadcast it to the other nodes"""
+        await self._run_handlers(event, data)
+        await redis_client.publish(self.channel, {"origin": NODE_ID, "event": event, "data": data})
+
+    async def handle(self, message: dict):
+        """Apply an event received from another node"""
+        if message.get("origin") == NODE_ID:
+            return
+        await self._run_handlers(message.get("event"), message.get("data") or {})
+
+    async def _run_handlers(self, event: str, data: dict):
+        for handler in self._handlers.get(event, ()):
+            try:
+                result = handler(data)
+                if asyncio.iscoroutine(result):
+                    await result
+            except Exception as e:
+                logger.error(f"Cluster event handler for {event} failed: {e}")
+
+# Global cluster event bus
+cluster_events = ClusterEvents()
+cluster_events.register("route_changed", lambda data: routing_registry.invalidate(data["user_id"]))
@@ -1,10 +1,24 @@
 from fastapi import WebSocket, WebSocketDisconnect
-from typing import Dict, List, Set
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set, Tuple, Union
 import json
 import asyncio
+import os
 from app.utils.redis_client import redis_client
+from app.services.message_dispatcher import MessageDispatcher
+from app.services.outbound_queue import OutboundQueue
+from app.services.routing_registry import NODE_ID, node_channel, routing_registry
+from app.services.presence_service import presence_service
+from app.services.presence_debouncer import PresenceDebouncer, StatusChange
+from app.services.typing_coalescer import TypingCoalescer
+from app.services.cluster_events import cluster_events
+from app.services.event_stream import event_stream
+from app.services.conversation_channels import conversation_channel, conversation_channels
+from app.utils.ttl_cache import TTLCache
+from app.utils.indexes import declare_indexes
+from app.utils.frames import Frame, JSON_PROTOCOL, as_frame, negotiate_subprotocol, pack_envelope
 from app.database import get_database
 from bson import ObjectId
+from pymongo import ASCENDING, IndexModel
 from datetime import datetime
 import logging
 
@@ -14,33 +28,72 @@ class ConnectionManager:
     def __init__(self):
         # Store active connections: {user_id: {websocket_objects}}
         self.active_connections: Dict[str, Set[WebSocket]] = {}
-        # Store user channels for Redis pub/sub
-        self.user_channels: Dict[str, str] = {}
+        # Bounded outbound buffer and writer task per socket
+        self.outbound_queues: Dict[WebSocket, OutboundQueue] = {}
+        # conversation_id -> participant IDs, so fan-out needs no database read
+        self.conversation_participants = TTLCache(
+            maxsize=int(os.getenv("CONVERSATION_CACHE_SIZE", 10000)),
+            ttl=float(os.getenv("CONVERSATION_CACHE_TTL", 300))
+        )
+        # user_id -> accepted friend IDs, so presence fan-out needs no friendships scan
+        self.friend_ids = TTLCache(
+            maxsize=int(os.getenv("FRIEND_CACHE_SIZE", 50000)),
+            ttl=float(os.getenv("FRIEND_CACHE_TTL", 600))
+        )
+        # One pub/sub reader per process routes messages to local sockets
+        self.dispatcher = MessageDispatcher(self)
+        # Suppresses reconnect flaps and batches friend status broadcasts per tick
+        self.status_debouncer = PresenceDebouncer(self._flush_status_changes)
+        # Throttles keystroke-level typing frames into typing/stopped transitions
+        self.typing_coalescer = TypingCoalescer(self._send_typing_indicator)
     
-    async def connect(self, websocket: WebSocket, user_id: str):
+    async def connect(self, websocket: WebSocket, user_id: str, last_event_id: Optional[str] = None):
         """Accept WebSocket connection and add to active connections"""
-        await websocket.accept()
+        # Clients may opt into MessagePack frames via the WebSocket subprotocol
+        subprotocol = negotiate_subprotocol(websocket.scope.get("subprotocols", []))
+        await websocket.accept(subprotocol=subprotocol)
+        self.dispatcher.ensure_started()
         
-        if user_id not in self.active_connections:
+        first_connection = user_id not in self.active_connections
+        if first_connection:
             self.active_connections[user_id] = set()
         
         self.active_connections[user_id].add(websocket)
         
+        outbound_queue = OutboundQueue(websocket, user_id, protocol=subprotocol or JSON_PROTOCOL)
+        self.outbound_queues[websocket] = outbound_queue
+        
         # Set user online in Redis
-        await redis_client.set_user_online(user_id)
+        await presence_service.mark_online(user_id)
+        
+        # Record that this node holds the user; messages for them arrive on the node channel
+        if first_connection:
+            await routing_registry.register(user_id)
+        
+        # Follow the user's group conversations through one channel per conversation
+        if first_connection:
+            try:
+                await conversation_channels.load_user(user_id)
+            except Exception as e:
+                logger.error(f"Failed to index group conversations for user {user_id}: {e}")
         
-        # Subscribe to user's personal channel
-        user_channel = f"user_channel:{user_id}"
-        self.user_channels[user_id] = user_channel
-        await redis_client.subscribe(user_channel)
+        # Send events missed since the client's last seen event ahead of live traffic
+        if last_event_id and event_stream.enabled:
+            await self._replay_events(outbound_queue, user_id, last_event_id)
+        outbound_queue.start()
         
-        # Notify friends that user is online
-        await self._notify_friends_status(user_id, True)
+        # Notify friends that user is online, once the grace period has passed
+        if first_connection:
+            self.status_debouncer.transition(user_id, True)
         
         logger.info(f"User {user_id} connected via WebSocket")
     
     async def disconnect(self, websocket: WebSocket, user_id: str):
         """Remove WebSocket connection"""
+        outbound_queue = self.outbound_queues.pop(websocket, None)
+        if outbound_queue:
+            await outbound_queue.close()
+        
         if user_id in self.active_connections:
             self.active_connections[user_id].discard(websocket)
             
@@ -48,73 +101,279 @@ class ConnectionManager:
             if not self.active_connections[user_id]:
                 del self.active_connections[user_id]
                 
-                # Set user offline
-                await redis_client.set_user_offline(user_id)
-                
-                # Unsubscribe from user channel
-                if user_id in self.user_channels:
-                    await redis_client.unsubscribe(self.user_channels[user_id])
-                    del self.user_channels[user_id]
+                # Set user offline unless another node still holds a socket
+                await routing_registry.unregister(user_id)
+                online_elsewhere = bool(await routing_registry.remote_nodes(user_id))
+                await presence_service.mark_offline(user_id, online_elsewhere)
+                await conversation_channels.leave(user_id)
                 
-                # Notify friends that user is offline
-                await self._notify_friends_status(user_id, False)
+                # Notify friends that user is offline, unless they reconnect within the grace period
+                if not online_elsewhere:
+                    self.status_debouncer.transition(user_id, False)
+                else:
+                    # The other node announces the eventual offline; a stale "online" here would
+                    # swallow the next reconnect to this node as a revert
+                    self.status_debouncer.forget(user_id)
         
         logger.info(f"User {user_id} disconnected from WebSocket")
     
-    async def send_personal_message(self, user_id: str, message: dict):
-        """Send message to specific user via Redis pub/sub"""
-        user_channel = f"user_channel:{user_id}"
-        await redis_client.publish(user_channel, message)
+    async def _replay_events(self, outbound_queue: OutboundQueue, user_id: str, last_event_id: str):
+        try:
+            frames, truncated = await event_stream.replay(user_id, last_event_id)
+        except Exception as e:
+            logger.error(f"Event replay failed for user {user_id}: {e}")
+            frames, truncated = [], True
+        
+        # truncated tells the client it must fall back to a full reload
+        frames.append(Frame({
+            "type": "replay_complete",
+            "replayed": len(frames),
+            "truncated": truncated
+        }))
+        outbound_queue.prepend(frames)
     
-    async def send_to_conversation(self, conversation_id: str, message: dict, exclude_user: str = None):
+    async def send_personal_message(self, user_id: str, message: Union[dict, Frame]):
+        """Send message to specific user, using Redis pub/sub only for other nodes"""
+        await self.send_batch([([user_id], message)])
+    
+    async def deliver_local(self, user_id: str, message: Union[dict, Frame]) -> bool:
+        """Send message to this process's sockets for a user"""
+        websockets = self.active_connections.get(user_id)
+        if not websockets:
+            return False
+        
+        frame = as_frame(message)
+        for websocket in list(websockets):
+            self.send_to_socket(websocket, frame)
+        return True
+    
+    def send_to_socket(self, websocket: WebSocket, message: Union[dict, Frame]) -> bool:
+        """Queue message on a socket's outbound buffer without waiting for the send"""
+        outbound_queue = self.outbound_queues.get(websocket)
+        if outbound_queue is None:
+            return False
+        return outbound_queue.put(as_frame(message))
+    
+    async def send_to_conversation(self, conversation_id: str, message: Union[dict, Frame], exclude_user: str = None):
         """Send message to all participants in a conversation"""
-        db = await get_database()
+        participants = await self.get_conversation_participants(conversation_id)
+        if not participants:
+            return
         
-        # Get conversation participants
-        conversation = await db.conversations.find_one({"_id": ObjectId(conversation_id)})
-        if not conversation:
+        frame = as_frame(message)
+        if not conversation_channels.uses_channel(participants) or event_stream.is_durable(frame):
+            # Small conversations, and durable events needing a stream ID per recipient, go per user
+            await self.send_to_users(participants, frame, exclude_user=exclude_user)
             return
         
-        # Send to all participants except the sender
-        for participant_id in conversation["participants"]:
-            if participant_id != exclude_user:
-                await self.send_personal_message(participant_id, message)
+        # Fan out locally, then publish once for every other node following the conversation
+        for user_id in participants:
+            if user_id != exclude_user:
+                await self.deliver_local(user_id, frame)
+        await redis_client.publish_raw(
+            conversation_channel(conversation_id),
+            pack_envelope(NODE_ID, frame, exclude_user or "")
+        )
+    
+    async def deliver_conversation_local(self, conversation_id: str, message: Union[dict, Frame], exclude_user: str = None) -> bool:
+        """Send a conversation channel message to this process's members of the conversation"""
+        members = conversation_channels.local_members.get(conversation_id)
+        if not members:
+            return False
+        
+        frame = as_frame(message)
+        delivered = False
+        for user_id in list(members):
+            if user_id != exclude_user and await self.deliver_local(user_id, frame):
+                delivered = True
+        return delivered
+    
+    async def send_to_users(self, user_ids: Iterable[str], message: Union[dict, Frame], exclude_user: str = None):
+        """Fan one message out to many users with a single pipelined Redis batch"""
+        await self.send_batch([(user_ids, message)], exclude_user=exclude_user)
+    
+    async def send_batch(
+        self,
+        deliveries: List[Tuple[Iterable[str], Union[dict, Frame]]],
+        exclude_user: str = None
+    ):
+        """Deliver several fan-outs locally and publish once per remote node in one pipelined batch"""
+        publishes = []
+        for user_ids, message in deliveries:
+            # Encode once and share the payload with every recipient
+            frame = as_frame(message)
+            recipients = [user_id for user_id in user_ids if user_id != exclude_user]
+            
+            # Durable events get a per-user stream ID spliced into the shared payload
+            event_ids = {}
+            if event_stream.is_durable(frame):
+                event_ids = await event_stream.append(recipients, frame)
+            
+            routes = await routing_registry.remote_nodes_many(recipients)
+            # node -> recipients there that share the unmodified payload
+            node_recipients: Dict[str, List[str]] = {}
+            for user_id in recipients:
+                user_frame = frame.with_event_id(event_ids[user_id]) if user_id in event_ids else frame
+                await self.deliver_local(user_id, user_frame)
+                for node in routes.get(user_id, ()):
+                    if user_frame is frame:
+                        node_recipients.setdefault(node, []).append(user_id)
+                    else:
+                        publishes.append((node_channel(node), pack_envelope(NODE_ID, user_frame, user_id)))
+            
+            for node, node_user_ids in node_recipients.items():
+                publishes.append((node_channel(node), pack_envelope(NODE_ID, frame, ",".join(node_user_ids))))
+        
+        if publishes:
+            await redis_client.publish_many(publishes)
+    
+    async def get_conversation_participants(self, conversation_id: str) -> Optional[List[str]]:
+        """Return a conversation's participants, reading Mongo only on a cache miss"""
+        participants = self.conversation_participants.get(conversation_id)
+        if participants is not None:
+            return participants
+        
+        db = await get_database()
+        conversation = await db.conversations.find_one(
+            {"_id": ObjectId(conversation_id)},
+            {"participants": 1}
+        )
+        if not conversation:
+            return None
+        
+        participants = conversation["participants"]
+        self.conversation_participants.set(conversation_id, participants)
+        return participants
+    
+    def cache_conversation(self, conversation_id: str, participants: List[str]):
+        """Prime the participant cache, e.g. right after creating a conversation"""
+        self.conversation_participants.set(conversation_id, list(participants))
+    
+    async def invalidate_conversation(self, conversation_id: str, participants: Optional[List[str]] = None):
+        """Refresh cached participants and conversation channels on every node after membership changes"""
+        data = {"conversation_id": conversation_id}
+        if participants is not None:
+            # Lets other nodes update without reading the conversation back
+            data["participants"] = list(participants)
+        await cluster_events.publish("conversation_changed", data)
     
-    async def broadcast_to_friends(self, user_id: str, message: dict):
+    async def sync_conversation_channel(self, conversation_id: str):
+        """Re-index this process's connected members of a conversation"""
+        if not self.active_connections and conversation_id not in conversation_channels.local_members:
+            return
+        participants = await self.get_conversation_participants(conversation_id)
+        await conversation_channels.sync(conversation_id, participants or [], self.active_connections)
+    
+    async def broadcast_to_friends(self, user_id: str, message: Union[dict, Frame]):
         """Broadcast message to all user's friends"""
+        friend_ids = await self.get_friend_ids(user_id)
+        if friend_ids:
+            await self.send_to_users(friend_ids, message)
+    
+    async def get_friend_ids(self, user_id: str) -> FrozenSet[str]:
+        """Return the user's accepted friends, scanning friendships only on a cache miss"""
+        friend_ids = self.friend_ids.get(user_id)
+        if friend_ids is not None:
+            return friend_ids
+        
         db = await get_database()
         
         # Get user's friends
-        friends_cursor = db.friendships.find({
-            "$or": [
-                {"requester_id": user_id, "status": "accepted"},
-                {"addressee_id": user_id, "status": "accepted"}
-            ]
-        })
-        
-        async for friendship in friends_cursor:
-            friend_id = (friendship["addressee_id"] 
-                        if friendship["requester_id"] == user_id 
-                        else friendship["requester_id"])
-            await self.send_personal_message(friend_id, message)
+        friends_cursor = db.friendships.find(
+            {
+                "$or": [
+                    {"requester_id": user_id, "status": "accepted"},
+                    {"addressee_id": user_id, "status": "accepted"}
+                ]
+            },
+            {"requester_id": 1, "addressee_id": 1}
+        )
+        
+        friend_ids = frozenset([
+            friendship["addressee_id"]
+            if friendship["requester_id"] == user_id
+            else friendship["requester_id"]
+            async for friendship in friends_cursor
+        ])
+        self.friend_ids.set(user_id, friend_ids)
+        return friend_ids
+    
+    async def invalidate_friends(self, *user_ids: str):
+        """Drop cached friend sets on every node after a friendship changes"""
+        await cluster_events.publish("friends_changed", {"user_ids": list(user_ids)})
     
     async def _notify_friends_status(self, user_id: str, is_online: bool):
         """Notify friends about user's online status"""
-        status_message = {
-            "type": "user_status",
+        await self._flush_status_changes([(user_id, is_online, datetime.utcnow())])
+    
+    async def _flush_status_changes(self, changes: List[StatusChange]):
+        """Broadcast a tick's worth of status changes to friends in one batch"""
+        deliveries = []
+        for user_id, is_online, timestamp in changes:
+            friend_ids = await self.get_friend_ids(user_id)
+            if not friend_ids:
+                continue
+            status_message = {
+                "type": "user_status",
+                "user_id": user_id,
+                "is_online": is_online,
+                "timestamp": timestamp.isoformat()
+            }
+            deliveries.append((friend_ids, status_message))
+        
+        if deliveries:
+            await self.send_batch(deliveries)
+    
+    async def _send_typing_indicator(self, user_id: str, conversation_id: str, is_typing: bool):
+        """Tell the other participants that a user started or stopped typing"""
+        typing_data = {
+            "type": "typing_indicator",
             "user_id": user_id,
-            "is_online": is_online,
-            "timestamp": datetime.utcnow().isoformat()
+            "conversation_id": conversation_id,
+            "is_typing": is_typing
         }
-        await self.broadcast_to_friends(user_id, status_message)
+        await self.send_to_conversation(conversation_id, typing_data, exclude_user=user_id)
     
     async def get_online_users(self) -> List[str]:
-        """Get list of currently online users"""
-        return list(self.active_connections.keys())
+        """Get list of currently online users across all nodes"""
+        return await presence_service.get_online_users()
     
     async def is_user_online(self, user_id: str) -> bool:
-        """Check if specific user is online"""
-        return user_id in self.active_connections
+        """Check if specific user is online on any node"""
+        return await presence_service.is_online(user_id)
+    
+    async def get_online_statuses(self, user_ids: List[str]) -> Dict[str, bool]:
+        """Check online status for many users in one Redis round trip"""
+        return await presence_service.get_online_statuses(user_ids)
+    
+    def get_connection_stats(self, limit: int = 50) -> List[dict]:
+        """Per-connection lag metrics, most backed-up connections first"""
+        stats = [queue.get_stats() for queue in self.outbound_queues.values()]
+        stats.sort(key=lambda s: (s["lag_ms"], s["depth"]), reverse=True)
+        return stats[:limit]
 
 # Global connection manager instance
 connection_manager = ConnectionManager()
+
+async def _conversation_changed(data: dict):
+    conversation_id = data["conversation_id"]
+    if data.get("participants") is not None:
+        connection_manager.cache_conversation(conversation_id, data["participants"])
+    else:
+        connection_manager.conversation_participants.invalidate(conversation_id)
+    await connection_manager.sync_conversation_channel(conversation_id)
+
+cluster_events.register("conversation_changed", _conversation_changed)
+
+def _invalidate_friend_ids(data: dict):
+    for user_id in data["user_ids"]:
+        connection_manager.friend_ids.invalidate(user_id)
+
+cluster_events.register("friends_changed", _invalidate_friend_ids)
+
+declare_indexes(
+    "friendships",
+    # Friend lists are an $or of the two directions, each served by its own index
+    IndexModel([("requester_id", ASCENDING), ("status", ASCENDING)]),
+    IndexModel([("addressee_id", ASCENDING), ("status", ASCENDING)])
+)
@@ -0,0 +1,104 @@
+from app.utils.redis_client import redis_client
+from app.database import get_database
+from app.utils.indexes import declare_indexes
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from typing import Dict, Iterable, List, Set
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+CONVERSATION_CHANNEL_PREFIX = "conversation_channel:"
+
+# Conversations at least this large are published once per conversation instead of once per participant
+CONVERSATION_CHANNEL_MIN_SIZE = max(2, int(os.getenv("CONVERSATION_CHANNEL_MIN_SIZE", 3)))
+
+def conversation_channel(conversation_id: str) -> str:
+    return f"{CONVERSATION_CHANNEL_PREFIX}{conversation_id}"
+
+class ConversationChannels:
+    """Per-process index of locally connected group members, with one subscription per conversation"""
+
+    def __init__(self, min_size: int = CONVERSATION_CHANNEL_MIN_SIZE):
+        self.min_size = min_size
+        # conversation_id -> locally connected participants
+        self.local_members: Dict[str, Set[str]] = {}
+        # user_id -> indexed conversations, so disconnect needs no lookup
+        self.user_conversations: Dict[str, Set[str]] = {}
+
+    def uses_channel(self, participants: List[str]) -> bool:
+        return len(participants) >= self.min_size
+
+    async def load_user(self, user_id: str):
+        """Index a newly connected user's group conversations"""
+        db = await get_database()
+        # Matching on the array position keeps this consistent with uses_channel
+        cursor = db.conversations.find(
+            {"participants": user_id, f"participants.{self.min_size - 1}": {"$exists": True}},
+            {"_id": 1}
+        )
+        conversation_ids = [str(conversation["_id"]) async for conversation in cursor]
+        await self.join(user_id, conversation_ids)
+
+    async def join(self, user_id: str, conversation_ids: Iterable[str]):
+        """Add a local member, subscribing to conversations this process was not yet following"""
+        new_channels = []
+        conversations = self.user_conversations.setdefault(user_id, set())
+        for conversation_id in conversation_ids:
+            members = self.local_members.get(conversation_id)
+            if members is None:
+                members = self.local_members[conversation_id] = set()
+                new_channels.append(conversation_channel(conversation_id))
+            members.add(user_id)
+            conversations.add(conversation_id)
+        await redis_client.subscribe(*new_channels)
+
+    async def leave(self, user_id: str, conversation_ids: Iterable[str] = None):
+        """Remove a local member, unsubscribing from conversations with no local members left"""
+        conversations = self.user_conversations.get(user_id, set())
+        if conversation_ids is None:
+            conversation_ids = list(conversations)
+
+        idle_channels = []
+        for conversation_id in conversation_ids:
+            conversations.discard(conversation_id)
+            members = self.local_members.get(conversation_id)
+            if members is None:
+                continue
+            members.discard(user_id)
+            if not members:
+                del self.local_members[conversation_id]
+                idle_channels.append(conversation_channel(conversation_id))
+
+        if not conversations:
+            self.user_conversations.pop(user_id, None)
+        await redis_client.unsubscribe(*idle_channels)
+
+    async def sync(self, conversation_id: str, participants: List[str], connected_users: Iterable[str]):
+        """Align the local members of one conversation after its membership changed"""
+        connected = set(connected_users)
+        wanted = set()
+        if participants and self.uses_channel(participants):
+            wanted = {user_id for user_id in participants if user_id in connected}
+        current = set(self.local_members.get(conversation_id, ()))
+
+        for user_id in wanted - current:
+            await self.join(user_id, [conversation_id])
+        for user_id in current - wanted:
+            await self.leave(user_id, [conversation_id])
+
+    def get_stats(self) -> dict:
+        return {
+            "min_size": self.min_size,
+            "subscribed_conversations": len(self.local_members),
+            "local_memberships": sum(len(members) for members in self.local_members.values())
+        }
+
+# Global conversation channel index
+conversation_channels = ConversationChannels()
+
+declare_indexes(
+    "conversations",
+    # Same index as the conversation list; its participants prefix serves load_user
+    IndexModel([("participants", ASCENDING), ("last_message_at", DESCENDING)])
+)
@@ -0,0 +1,80 @@
+from app.utils.redis_client import redis_client
+from app.utils.frames import Frame
+from typing import Dict, List, Tuple
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+STREAM_KEY_PREFIX = "user_events:"
+
+# Transient updates that are not worth replaying after a reconnect
+EPHEMERAL_TYPES = {"typing_indicator", "user_status", "pong"}
+
+def _parse_stream_id(event_id: str) -> Tuple[int, int]:
+    millis, _, seq = event_id.partition("-")
+    return int(millis), int(seq or 0)
+
+class UserEventStream:
+    """Optional capped Redis Stream per user so reconnecting clients can replay missed events"""
+
+    def __init__(self):
+        self.enabled = os.getenv("USER_EVENT_STREAM_ENABLED", "false").lower() in ("1", "true", "yes")
+        self.maxlen = int(os.getenv("USER_EVENT_STREAM_MAXLEN", 500))
+        self.ttl = int(os.getenv("USER_EVENT_STREAM_TTL", 86400))
+
+    def is_durable(self, frame: Frame) -> bool:
+        return self.enabled and frame.message.get("type") not in EPHEMERAL_TYPES
+
+    async def append(self, user_ids: List[str], frame: Frame) -> Dict[str, str]:
+        """Record one event for many users in a single pipeline; returns user_id -> event ID"""
+        pipe = redis_client.pipeline()
+        if pipe is None or not user_ids:
+            return {}
+        async with pipe:
+            for user_id in user_ids:
+                key = f"{STREAM_KEY_PREFIX}{user_id}"
+                pipe.xadd(key, {"data": frame.text}, maxlen=self.maxlen, approximate=True)
+                pipe.expire(key, self.ttl)
+            results = await pipe.execute()
+        # Every other result is the EXPIRE reply
+        return dict(zip(user_ids, results[::2]))
+
+    async def replay(self, user_id: str, last_event_id: str) -> Tuple[List[Frame], bool]:
+        """Return events after last_event_id and whether older events were already trimmed"""
+        pipe = redis_client.pipeline()
+        if pipe is None:
+            return [], False
+        try:
+            last = _parse_stream_id(last_event_id)
+        except ValueError:
+            return [], True
+
+        key = f"{STREAM_KEY_PREFIX}{user_id}"
+        async with pipe:
+            pipe.xrange(key, min=f"({last_event_id}", max="+", count=self.maxlen)
+            pipe.xrange(key, min="-", max="+", count=1)
+            pipe.xlen(key)
+            pipe.exists(key)
+            entries, oldest, length, exists = await pipe.execute()
+
+        oldest_id = _parse_stream_id(oldest[0][0]) if oldest else None
+        # Events between last_event_id and the oldest retained entry may have been trimmed
+        trimmed = oldest_id is not None and length >= self.maxlen and oldest_id > last
+        # The client saw an event, so its stream existed; a missing key means it expired.
+        # A stream idle for longer than the TTL may also have expired and been recreated since.
+        stale = last[0] < (time.time() - self.ttl) * 1000
+        expired = not exists or (stale and (oldest_id is None or oldest_id > last))
+        truncated = trimmed or expired
+
+        frames = []
+        for event_id, fields in entries:
+            if "data" not in fields:
+                logger.warning(f"Skipping malformed event {event_id} for user {user_id}")
+                continue
+            frames.append(Frame(text=fields["data"]).with_event_id(event_id))
+        return frames, truncated
+
+# Global user event stream instance
+event_stream = UserEventStream()
@@ -0,0 +1,151 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Optional
+
+from app.utils.redis_client import redis_client
+from app.services.cluster_events import cluster_events
+from app.services.routing_registry import NODE_ID, routing_registry
+from app.services.conversation_channels import CONVERSATION_CHANNEL_PREFIX
+from app.utils.frames import unpack_envelope
+from app.utils.query_metrics import start_background_task
+
+logger = logging.getLogger(__name__)
+
+class MessageDispatcher:
+    """Single per-process Redis pub/sub reader that routes messages to local sockets"""
+
+    def __init__(self, manager, queue_size: Optional[int] = None, read_timeout: Optional[float] = None):
+        self.manager = manager
+        self.queue_size = queue_size or int(os.getenv("WS_DISPATCH_QUEUE_SIZE", 10000))
+        self.read_timeout = read_timeout or float(os.getenv("WS_DISPATCH_READ_TIMEOUT", 1.0))
+        self.queue: Optional[asyncio.Queue] = None
+        self._reader_task: Optional[asyncio.Task] = None
+        self._router_task: Optional[asyncio.Task] = None
+
+        # Counters
+        self.messages_received = 0
+        self.messages_dispatched = 0
+        self.messages_unroutable = 0
+        self.messages_skipped = 0
+        self.max_queue_depth = 0
+        self.total_latency = 0.0
+        # Messages whose queue-to-done latency is in total_latency
+        self.latency_samples = 0
+        self.max_latency = 0.0
+        self.last_latency = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._reader_task is not None and not self._reader_task.done()
+
+    def ensure_started(self):
+        """Start the reader and router tasks if they are not already running"""
+        if self.running:
+            return
+        self.queue = asyncio.Queue(maxsize=self.queue_size)
+        self._reader_task = start_background_task(self._reader_loop())
+        self._router_task = start_background_task(self._router_loop())
+        logger.info("Redis message dispatcher started")
+
+    async def stop(self):
+        """Cancel the dispatcher tasks"""
+        for task in (self._reader_task, self._router_task):
+            if task:
+                task.cancel()
+        for task in (self._reader_task, self._router_task):
+            if task:
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._reader_task = None
+        self._router_task = None
+
+    async def _reader_loop(self):
+        """Block on the shared pubsub and hand messages to the router"""
+        await redis_client.subscribe(cluster_events.channel, routing_registry.channel)
+        while True:
+            try:
+                message = await redis_client.read_message(timeout=self.read_timeout)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Redis dispatcher read error: {e}")
+                await asyncio.sleep(self.read_timeout)
+                continue
+
+            if message is None:
+                continue
+
+            self.messages_received += 1
+            await self.queue.put((time.perf_counter(), message["channel"], message["data"]))
+            depth = self.queue.qsize()
+            if depth > self.max_queue_depth:
+                self.max_queue_depth = depth
+
+    async def _router_loop(self):
+        """Deliver queued messages to the sockets registered for their channel"""
+        while True:
+            received_at, channel, data = await self.queue.get()
+            try:
+                await self._route(channel, data)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Redis dispatcher routing error on {channel}: {e}")
+            finally:
+                self.queue.task_done()
+
+            latency = time.perf_counter() - received_at
+            self.last_latency = latency
+            self.total_latency += latency
+            self.latency_samples += 1
+            if latency > self.max_latency:
+                self.max_latency = latency
+
+    async def _route(self, channel: str, data: str):
+        if channel == cluster_events.channel:
+            await cluster_events.handle(json.loads(data))
+            return
+        if channel == routing_registry.channel:
+            origin, recipients, frame = unpack_envelope(data)
+            if origin == NODE_ID:
+                # Already delivered to local sockets before publishing
+                self.messages_skipped += 1
+                return
+            # The payload is forwarded as received, without decoding it
+            delivered = False
+            for user_id in recipients.split(","):
+                if user_id and await self.manager.deliver_local(user_id, frame):
+                    delivered = True
+            if delivered:
+                self.messages_dispatched += 1
+                return
+        elif channel.startswith(CONVERSATION_CHANNEL_PREFIX):
+            origin, exclude_user, frame = unpack_envelope(data)
+            if origin == NODE_ID:
+                self.messages_skipped += 1
+                return
+            conversation_id = channel[len(CONVERSATION_CHANNEL_PREFIX):]
+            if await self.manager.deliver_conversation_local(conversation_id, frame, exclude_user or None):
+                self.messages_dispatched += 1
+                return
+        self.messages_unroutable += 1
+
+    def get_stats(self) -> dict:
+        """Return dispatcher counters"""
+        return {
+            "running": self.running,
+            "messages_received": self.messages_received,
+            "messages_dispatched": self.messages_dispatched,
+            "messages_unroutable": self.messages_unroutable,
+            "messages_skipped": self.messages_skipped,
+            "queue_depth": self.queue.qsize() if self.queue else 0,
+            "max_queue_depth": self.max_queue_depth,
+            "avg_dispatch_latency_ms": (self.total_latency / self.latency_samples * 1000) if self.latency_samples else 0.0,
+            "max_dispatch_latency_ms": self.max_latency * 1000,
+            "last_dispatch_latency_ms": self.last_latency * 1000,
+        }
@@ -2,6 +2,8 @@ from app.models.notification import Notification
 from app.database import get_database
 from datetime import datetime
 from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from app.utils.indexes import declare_indexes
 
 class NotificationService:
     def __init__(self):
@@ -22,3 +24,8 @@ class NotificationService:
         return Notification(**notification)
 
 notification_service = NotificationService()
+
+declare_indexes(
+    "system_notifications",
+    IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING)])
+)
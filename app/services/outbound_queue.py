@@ -0,0 +1,210 @@
+from fastapi import WebSocket
+from collections import deque
+from app.utils.frames import Frame, JSON_PROTOCOL
+from enum import Enum
+from typing import Deque, Dict, Hashable, List, Optional
+import asyncio
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+class SlowConsumerPolicy(str, Enum):
+    DROP_OLDEST = "drop_oldest"
+    COALESCE = "coalesce"
+    DISCONNECT = "disconnect"
+
+DEFAULT_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", 256))
+DEFAULT_POLICY = SlowConsumerPolicy(os.getenv("WS_SLOW_CONSUMER_POLICY", SlowConsumerPolicy.DROP_OLDEST.value))
+
+# Close code sent to consumers disconnected for falling behind ("try again later")
+SLOW_CONSUMER_CLOSE_CODE = 1013
+
+def coalesce_key(message: dict) -> Optional[Hashable]:
+    """Return a key for messages where only the latest value matters"""
+    message_type = message.get("type")
+    if message_type == "typing_indicator":
+        return (message_type, message.get("conversation_id"), message.get("user_id"))
+    if message_type == "user_status":
+        return (message_type, message.get("user_id"))
+    return None
+
+class _Entry:
+    __slots__ = ("enqueued_at", "key", "frame")
+
+    def __init__(self, enqueued_at: float, key: Optional[Hashable], frame: Frame):
+        self.enqueued_at = enqueued_at
+        self.key = key
+        self.frame = frame
+
+class OutboundQueue:
+    """Bounded send buffer with its own writer task for a single WebSocket"""
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        user_id: str,
+        protocol: str = JSON_PROTOCOL,
+        maxsize: int = DEFAULT_QUEUE_SIZE,
+        policy: SlowConsumerPolicy = DEFAULT_POLICY
+    ):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.protocol = protocol
+        self.maxsize = maxsize
+        self.policy = policy
+        self._buffer: Deque[_Entry] = deque()
+        self._pending: Dict[Hashable, _Entry] = {}
+        self._ready = asyncio.Event()
+        self._closed = False
+        self._writer_task: Optional[asyncio.Task] = None
+        # Held so the slow-consumer close is not garbage-collected before it runs
+        self._disconnect_task: Optional[asyncio.Task] = None
+
+        # Lag metrics
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.max_depth = 0
+        self.last_send_time = 0.0
+        self.max_send_time = 0.0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+
+    def start(self):
+        """Start the writer task"""
+        if self._writer_task is None:
+            self._writer_task = asyncio.create_task(self._writer())
+
+    async def close(self):
+        """Stop the writer task and discard anything still queued"""
+        self._closed = True
+        self._buffer.clear()
+        self._pending.clear()
+        if self._writer_task and self._writer_task is not asyncio.current_task():
+            self._writer_task.cancel()
+            try:
+                await self._writer_task
+            except asyncio.CancelledError:
+                pass
+            except Exception:
+                pass
+
+    def put(self, frame: Frame) -> bool:
+        """Queue a frame without blocking; returns False if it was not accepted"""
+        if self._closed:
+            return False
+
+        key = coalesce_key(frame.message) if self.policy == SlowConsumerPolicy.COALESCE else None
+        if key is not None and key in self._pending:
+            # Replace the unsent message in place, keeping its queue position
+            self._pending[key].frame = frame
+            self.coalesced += 1
+            return True
+
+        if len(self._buffer) >= self.maxsize:
+            if self.policy == SlowConsumerPolicy.DISCONNECT:
+                self._closed = True
+                self._disconnect_task = asyncio.create_task(self._disconnect_slow_consumer())
+                return False
+            oldest = self._buffer.popleft()
+            if oldest.key is not None:
+                self._pending.pop(oldest.key, None)
+            self.dropped += 1
+
+        entry = _Entry(time.perf_counter(), key, frame)
+        self._buffer.append(entry)
+        if key is not None:
+            self._pending[key] = entry
+        if len(self._buffer) > self.max_depth:
+            self.max_depth = len(self._buffer)
+        self._ready.set()
+        return True
+
+    def prepend(self, frames: List[Frame]):
+        """Put replayed frames ahead of anything buffered, dropping buffered duplicates"""
+        replayed_ids = {frame.event_id for frame in frames if frame.event_id}
+        live = [entry for entry in self._buffer if not replayed_ids or entry.frame.event_id not in replayed_ids]
+        now = time.perf_counter()
+        self._buffer = deque([_Entry(now, None, frame) for frame in frames] + live)
+        self._pending = {entry.key: entry for entry in live if entry.key is not None}
+        if len(self._buffer) > self.max_depth:
+            self.max_depth = len(self._buffer)
+        if self._buffer:
+            self._ready.set()
+
+    async def _writer(self):
+        """Drain the buffer to the socket one message at a time"""
+        try:
+            while not self._closed:
+                if not self._buffer:
+                    self._ready.clear()
+                    await self._ready.wait()
+                    continue
+
+                entry = self._buffer.popleft()
+                if entry.key is not None:
+                    self._pending.pop(entry.key, None)
+
+                started = time.perf_counter()
+                self.last_lag = started - entry.enqueued_at
+                if self.last_lag > self.max_lag:
+                    self.max_lag = self.last_lag
+
+                payload = entry.frame.encode(self.protocol)
+                if isinstance(payload, bytes):
+                    await self.websocket.send_bytes(payload)
+                else:
+                    await self.websocket.send_text(payload)
+
+                self.last_send_time = time.perf_counter() - started
+                if self.last_send_time > self.max_send_time:
+                    self.max_send_time = self.last_send_time
+                self.sent += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # The receive loop notices the broken socket and runs disconnect()
+            self._closed = True
+            logger.warning(f"Writer for user {self.user_id} stopped: {e}")
+
+    async def _disconnect_slow_consumer(self):
+        logger.warning(
+            f"Disconnecting slow consumer {self.user_id}: {len(self._buffer)} messages queued"
+        )
+        await self.close()
+        try:
+            await self.websocket.close(code=SLOW_CONSUMER_CLOSE_CODE)
+        except Exception:
+            pass
+
+    @property
+    def depth(self) -> int:
+        return len(self._buffer)
+
+    @property
+    def lag(self) -> float:
+        """Age in seconds of the oldest unsent message"""
+        if not self._buffer:
+            return 0.0
+        return time.perf_counter() - self._buffer[0].enqueued_at
+
+    def get_stats(self) -> dict:
+        """Return per-connection lag metrics"""
+        return {
+            "user_id": self.user_id,
+            "protocol": self.protocol,
+            "policy": self.policy.value,
+            "depth": self.depth,
+            "max_depth": self.max_depth,
+            "lag_ms": self.lag * 1000,
+            "last_lag_ms": self.last_lag * 1000,
+            "max_lag_ms": self.max_lag * 1000,
+            "last_send_ms": self.last_send_time * 1000,
+            "max_send_ms": self.max_send_time * 1000,
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+            "closed": self._closed
+        }
@@ -1,9 +1,13 @@
 from app.models.permissions import CapsulePermission, PermissionLevel, ShareRequest
 from app.database import get_database
 from app.services.connection_manager import connection_manager
+from app.repositories.capsule_repository import capsule_repository
+from app.repositories.user_repository import user_repository
 from bson import ObjectId
 from datetime import datetime, timedelta
 from typing import List, Optional
+from pymongo import ASCENDING, IndexModel
+from app.utils.indexes import declare_indexes
 
 class PermissionService:
     def __init__(self):
@@ -14,17 +18,14 @@ class PermissionService:
         db = await get_database()
         
         # Get the user to share with
-        target_user = await db.users.find_one({"username": share_request.username})
+        target_user = await user_repository.find_by_username(share_request.username, "id")
         if not target_user:
             raise ValueError("User not found")
         
         target_user_id = str(target_user["_id"])
         
         # Verify capsule ownership
-        capsule = await db.temporal_capsules.find_one({
-            "_id": ObjectId(share_request.capsule_id),
-            "user_id": owner_id
-        })
+        capsule = await capsule_repository.get_owned(share_request.capsule_id, owner_id, "title")
         if not capsule:
             raise ValueError("Capsule not found or access denied")
         
@@ -88,21 +89,24 @@ class PermissionService:
                 {"expires_at": {"$exists": False}},
                 {"expires_at": {"$gt": datetime.utcnow()}}
             ]
-        })
+        }, {"capsule_id": 1, "owner_id": 1, "permission_level": 1, "granted_at": 1})
+        
+        permissions = await permissions_cursor.to_list(length=None)
+        
+        # Capsules and their owners in one query each
+        capsules = await capsule_repository.get_many(
+            [permission["capsule_id"] for permission in permissions], "shared"
+        )
+        owners = await user_repository.get_many(
+            [permission["owner_id"] for permission in permissions], "summary"
+        )
         
         shared_capsules = []
-        async for permission in permissions_cursor:
-            # Get the capsule details
-            capsule = await db.temporal_capsules.find_one({
-                "_id": ObjectId(permission["capsule_id"])
-            })
+        for permission in permissions:
+            capsule = capsules.get(permission["capsule_id"])
+            owner = owners.get(permission["owner_id"])
             
-            if capsule:
-                # Get owner details
-                owner = await db.users.find_one({
-                    "_id": ObjectId(permission["owner_id"])
-                })
-                
+            if capsule and owner:
                 capsule_data = {
                     "id": str(capsule["_id"]),
                     "title": capsule["title"],
@@ -190,3 +194,12 @@ class PermissionService:
         )
 
 permission_service = PermissionService()
+
+declare_indexes(
+    "capsule_permissions",
+    # Access checks and re-shares match on capsule, grantee and active flag
+    IndexModel([("capsule_id", ASCENDING), ("shared_with_user_id", ASCENDING), ("is_active", ASCENDING)]),
+    IndexModel([("shared_with_user_id", ASCENDING), ("is_active", ASCENDING)]),
+    IndexModel([("owner_id", ASCENDING)]),
+    IndexModel([("expires_at", ASCENDING)])
+)
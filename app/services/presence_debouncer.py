@@ -0,0 +1,112 @@
+from app.utils.query_metrics import start_background_task
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+import asyncio
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+PRESENCE_GRACE_PERIOD = float(os.getenv("PRESENCE_GRACE_PERIOD", 5))
+PRESENCE_TICK_INTERVAL = float(os.getenv("PRESENCE_TICK_INTERVAL", 1))
+
+# (user_id, is_online, timestamp) triples flushed together once per tick
+StatusChange = Tuple[str, bool, datetime]
+
+class PresenceDebouncer:
+    """Grace-period state machine that absorbs online/offline flaps before friends hear about them"""
+
+    def __init__(
+        self,
+        flush: Callable[[List[StatusChange]], Awaitable[None]],
+        grace_period: float = PRESENCE_GRACE_PERIOD,
+        tick_interval: float = PRESENCE_TICK_INTERVAL
+    ):
+        self._flush = flush
+        self.grace_period = grace_period
+        self.tick_interval = tick_interval
+        # Users whose last announced state is online
+        self._announced_online: Set[str] = set()
+        # user_id -> (target state, monotonic time of first change, wall-clock timestamp)
+        self._pending: Dict[str, Tuple[bool, float, datetime]] = {}
+        self._tick_task: Optional[asyncio.Task] = None
+
+        # Counters
+        self.transitions = 0
+        self.suppressed = 0
+        self.announced = 0
+        self.flushes = 0
+
+    def ensure_started(self):
+        if self._tick_task is None or self._tick_task.done():
+            self._tick_task = start_background_task(self._tick_loop())
+
+    async def stop(self):
+        if self._tick_task:
+            self._tick_task.cancel()
+            try:
+                await self._tick_task
+            except asyncio.CancelledError:
+                pass
+            self._tick_task = None
+
+    def transition(self, user_id: str, is_online: bool):
+        """Record a status change; it is announced only if it survives the grace period"""
+        self.transitions += 1
+        if is_online == (user_id in self._announced_online):
+            # Reverts a change still inside its grace period
+            if self._pending.pop(user_id, None) is not None:
+                self.suppressed += 1
+            return
+
+        if user_id not in self._pending:
+            self._pending[user_id] = (is_online, time.monotonic(), datetime.utcnow())
+        self.ensure_started()
+
+    def forget(self, user_id: str):
+        """Drop the user's state when another node takes over announcing their presence"""
+        self._pending.pop(user_id, None)
+        self._announced_online.discard(user_id)
+
+    async def flush_due(self):
+        """Announce every change that has outlived the grace period, as one batch"""
+        if not self._pending:
+            return
+        now = time.monotonic()
+        due: List[StatusChange] = []
+        for user_id, (is_online, since, timestamp) in list(self._pending.items()):
+            if now - since < self.grace_period:
+                continue
+            del self._pending[user_id]
+            if is_online:
+                self._announced_online.add(user_id)
+            else:
+                self._announced_online.discard(user_id)
+            due.append((user_id, is_online, timestamp))
+
+        if due:
+            self.announced += len(due)
+            self.flushes += 1
+            await self._flush(due)
+
+    async def _tick_loop(self):
+        while True:
+            await asyncio.sleep(self.tick_interval)
+            try:
+                await self.flush_due()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Presence status flush failed: {e}")
+
+    def get_stats(self) -> dict:
+        return {
+            "grace_period": self.grace_period,
+            "pending": len(self._pending),
+            "announced_online": len(self._announced_online),
+            "transitions": self.transitions,
+            "suppressed": self.suppressed,
+            "announced": self.announced,
+            "flushes": self.flushes
+        }
@@ -0,0 +1,136 @@
+from app.utils.redis_client import redis_client
+from app.services.routing_registry import NODE_ID, ROUTE_KEY_PREFIX, ROUTE_TTL
+from app.utils.query_metrics import start_background_task
+from typing import Dict, Iterable, List, Optional, Set
+import asyncio
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+ONLINE_KEY_PREFIX = "user_online:"
+# Sorted set of online user IDs scored by last heartbeat, for cluster-wide listings
+ONLINE_USERS_KEY = "online_users"
+
+PRESENCE_TTL = int(os.getenv("PRESENCE_TTL", 90))
+HEARTBEAT_INTERVAL = float(os.getenv("PRESENCE_HEARTBEAT_INTERVAL", 30))
+HEARTBEAT_BATCH_SIZE = 1000
+
+class PresenceService:
+    """Cluster-wide online status backed by Redis keys refreshed by heartbeats"""
+
+    def __init__(self):
+        # Users with at least one socket on this process
+        self.local_users: Set[str] = set()
+        self._last_heartbeat: Dict[str, float] = {}
+        self._heartbeat_task: Optional[asyncio.Task] = None
+
+    def ensure_started(self):
+        """Start the periodic heartbeat for locally connected users"""
+        if self._heartbeat_task is None or self._heartbeat_task.done():
+            self._heartbeat_task = start_background_task(self._heartbeat_loop())
+
+    async def stop(self):
+        if self._heartbeat_task:
+            self._heartbeat_task.cancel()
+            try:
+                await self._heartbeat_task
+            except asyncio.CancelledError:
+                pass
+            self._heartbeat_task = None
+
+    async def mark_online(self, user_id: str):
+        """Record a local connection and publish the user's presence"""
+        self.local_users.add(user_id)
+        self.ensure_started()
+        await self._heartbeat([user_id])
+
+    async def mark_offline(self, user_id: str, online_elsewhere: bool = False):
+        """Remove the user's presence once their last local socket closes"""
+        self.local_users.discard(user_id)
+        self._last_heartbeat.pop(user_id, None)
+        if online_elsewhere:
+            # Another node keeps the shared keys alive with its own heartbeats
+            return
+        pipe = redis_client.pipeline()
+        if pipe is None:
+            return
+        async with pipe:
+            pipe.delete(f"{ONLINE_KEY_PREFIX}{user_id}")
+            pipe.zrem(ONLINE_USERS_KEY, user_id)
+            await pipe.execute()
+
+    async def touch(self, user_id: str):
+        """Heartbeat from the socket loop, rate limited to one per interval"""
+        last = self._last_heartbeat.get(user_id, 0.0)
+        if time.monotonic() - last >= HEARTBEAT_INTERVAL:
+            await self._heartbeat([user_id])
+
+    async def is_online(self, user_id: str) -> bool:
+        """Check whether a user has a live socket on any node"""
+        statuses = await self.get_online_statuses([user_id])
+        return statuses[user_id]
+
+    async def get_online_statuses(self, user_ids: Iterable[str]) -> Dict[str, bool]:
+        """Resolve presence for many users with a single MGET"""
+        statuses: Dict[str, bool] = {}
+        remote: List[str] = []
+        for user_id in user_ids:
+            if user_id in self.local_users:
+                statuses[user_id] = True
+            elif user_id not in statuses:
+                statuses[user_id] = False
+                remote.append(user_id)
+
+        if remote:
+            values = await redis_client.mget([f"{ONLINE_KEY_PREFIX}{user_id}" for user_id in remote])
+            for user_id, value in zip(remote, values):
+                statuses[user_id] = value is not None
+        return statuses
+
+    async def get_online_users(self) -> List[str]:
+        """List users with a heartbeat inside the presence TTL"""
+        if redis_client.client is None:
+            return list(self.local_users)
+        cutoff = time.time() - PRESENCE_TTL
+        return await redis_client.zrangebyscore(ONLINE_USERS_KEY, cutoff, "+inf")
+
+    async def _heartbeat(self, user_ids: List[str]):
+        """Refresh presence and route keys for users in one pipeline"""
+        pipe = redis_client.pipeline()
+        if pipe is None:
+            return
+        now = time.time()
+        async with pipe:
+            for user_id in user_ids:
+                pipe.setex(f"{ONLINE_KEY_PREFIX}{user_id}", PRESENCE_TTL, "true")
+                # Re-adds this node's route should another node have pruned it during a heartbeat gap
+                pipe.hset(f"{ROUTE_KEY_PREFIX}{user_id}", NODE_ID, "1")
+                pipe.expire(f"{ROUTE_KEY_PREFIX}{user_id}", ROUTE_TTL)
+            pipe.zadd(ONLINE_USERS_KEY, {user_id: now for user_id in user_ids})
+            await pipe.execute()
+
+        beat_at = time.monotonic()
+        for user_id in user_ids:
+            if user_id in self.local_users:
+                self._last_heartbeat[user_id] = beat_at
+
+    async def _heartbeat_loop(self):
+        """Refresh presence for every local user so idle sockets stay online"""
+        while True:
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+            try:
+                users = list(self.local_users)
+                for start in range(0, len(users), HEARTBEAT_BATCH_SIZE):
+                    await self._heartbeat(users[start:start + HEARTBEAT_BATCH_SIZE])
+                await redis_client.zremrangebyscore(
+                    ONLINE_USERS_KEY, "-inf", time.time() - PRESENCE_TTL
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Presence heartbeat failed: {e}")
+
+# Global presence service instance
+presence_service = PresenceService()
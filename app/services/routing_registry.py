@@ -0,0 +1,190 @@
+from app.utils.redis_client import redis_client
+from app.utils.query_metrics import start_background_task
+from app.utils.ttl_cache import TTLCache
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set
+import asyncio
+import logging
+import os
+import socket
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# Identifies this worker process in the routing table
+NODE_ID = os.getenv("NODE_ID") or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+ROUTE_KEY_PREFIX = "user_routes:"
+ROUTE_TTL = int(os.getenv("WS_ROUTE_TTL", 300))
+
+# Each worker subscribes once to its own channel; publishers address nodes, not users
+NODE_CHANNEL_PREFIX = "node_channel:"
+
+# Refreshed by each live node; route fields of nodes without one are pruned
+NODE_ALIVE_KEY_PREFIX = "node_alive:"
+NODE_ALIVE_TTL = int(os.getenv("WS_NODE_ALIVE_TTL", 30))
+NODE_HEARTBEAT_INTERVAL = NODE_ALIVE_TTL / 3
+
+def node_channel(node_id: str) -> str:
+    return f"{NODE_CHANNEL_PREFIX}{node_id}"
+
+class RoutingRegistry:
+    """Records which worker nodes hold sockets for which users"""
+
+    def __init__(self):
+        self.node_id = NODE_ID
+        self.channel = node_channel(NODE_ID)
+        # user_id -> nodes other than this one; kept fresh by route_changed events
+        self._remote_nodes = TTLCache(
+            maxsize=int(os.getenv("WS_ROUTE_CACHE_SIZE", 50000)),
+            ttl=float(os.getenv("WS_ROUTE_CACHE_TTL", 30))
+        )
+        # node_id -> whether its alive key was present, so sends do not check it every time
+        self._node_alive = TTLCache(
+            maxsize=1000,
+            ttl=float(os.getenv("WS_NODE_ALIVE_CACHE_TTL", 5))
+        )
+        self._heartbeat_task: Optional[asyncio.Task] = None
+        self.pruned_routes = 0
+
+    async def start(self):
+        """Mark this node alive and keep it so; called before any route names it"""
+        if self._heartbeat_task is None or self._heartbeat_task.done():
+            await self._beat()
+            self._heartbeat_task = start_background_task(self._heartbeat_loop())
+
+    async def stop(self, user_ids: Iterable[str] = ()):
+        """Remove this node's routes for user_ids and its alive key, e.g. at shutdown"""
+        if self._heartbeat_task:
+            self._heartbeat_task.cancel()
+            try:
+                await self._heartbeat_task
+            except asyncio.CancelledError:
+                pass
+            self._heartbeat_task = None
+
+        user_ids = list(user_ids)
+        pipe = redis_client.pipeline()
+        if pipe is None:
+            return
+        async with pipe:
+            for user_id in user_ids:
+                pipe.hdel(f"{ROUTE_KEY_PREFIX}{user_id}", self.node_id)
+            pipe.delete(f"{NODE_ALIVE_KEY_PREFIX}{self.node_id}")
+            await pipe.execute()
+        for user_id in user_ids:
+            await self._announce(user_id)
+
+    async def register(self, user_id: str):
+        """Record that this node holds a socket for the user"""
+        await self.start()
+        key = f"{ROUTE_KEY_PREFIX}{user_id}"
+        await redis_client.hset(key, self.node_id, "1", ttl=ROUTE_TTL)
+        await self._announce(user_id)
+
+    async def unregister(self, user_id: str):
+        """Remove this node from the user's routes"""
+        await redis_client.hdel(f"{ROUTE_KEY_PREFIX}{user_id}", self.node_id)
+        await self._announce(user_id)
+
+    async def remote_nodes(self, user_id: str) -> FrozenSet[str]:
+        """Return the other nodes that hold sockets for the user"""
+        nodes = self._remote_nodes.get(user_id)
+        if nodes is None:
+            all_nodes = await redis_client.hkeys(f"{ROUTE_KEY_PREFIX}{user_id}")
+            routes = await self._live_routes({user_id: all_nodes})
+            nodes = routes[user_id]
+            self._remote_nodes.set(user_id, nodes)
+        return nodes
+
+    async def remote_nodes_many(self, user_ids: Iterable[str]) -> Dict[str, FrozenSet[str]]:
+        """Resolve remote nodes for many users, reading cache misses in one pipeline"""
+        routes: Dict[str, FrozenSet[str]] = {}
+        missing = []
+        for user_id in user_ids:
+            nodes = self._remote_nodes.get(user_id)
+            if nodes is None:
+                missing.append(user_id)
+            else:
+                routes[user_id] = nodes
+        if not missing:
+            return routes
+
+        missing = list(dict.fromkeys(missing))
+        pipe = redis_client.pipeline()
+        if pipe is None:
+            routes.update((user_id, frozenset()) for user_id in missing)
+            return routes
+        async with pipe:
+            for user_id in missing:
+                pipe.hkeys(f"{ROUTE_KEY_PREFIX}{user_id}")
+            replies = await pipe.execute()
+
+        live = await self._live_routes(dict(zip(missing, replies)))
+        for user_id, nodes in live.items():
+            self._remote_nodes.set(user_id, nodes)
+            routes[user_id] = nodes
+        return routes
+
+    async def _live_routes(self, all_routes: Dict[str, List[str]]) -> Dict[str, FrozenSet[str]]:
+        """Drop this node and dead nodes from users' routes, pruning dead nodes from Redis"""
+        candidates: Set[str] = {node for nodes in all_routes.values() for node in nodes if node != self.node_id}
+        alive: Dict[str, bool] = {}
+        unknown = []
+        for node in candidates:
+            cached = self._node_alive.get(node)
+            if cached is None:
+                unknown.append(node)
+            else:
+                alive[node] = cached
+        if unknown:
+            values = await redis_client.mget([f"{NODE_ALIVE_KEY_PREFIX}{node}" for node in unknown])
+            for node, value in zip(unknown, values):
+                alive[node] = value is not None
+                self._node_alive.set(node, alive[node])
+
+        routes: Dict[str, FrozenSet[str]] = {}
+        dead: List[tuple] = []
+        for user_id, nodes in all_routes.items():
+            live = []
+            for node in nodes:
+                if node == self.node_id:
+                    continue
+                if alive[node]:
+                    live.append(node)
+                else:
+                    dead.append((user_id, node))
+            routes[user_id] = frozenset(live)
+
+        if dead:
+            # A node that crashed never removed its fields; other nodes' heartbeats keep the key alive
+            pipe = redis_client.pipeline()
+            if pipe is not None:
+                async with pipe:
+                    for user_id, node in dead:
+                        pipe.hdel(f"{ROUTE_KEY_PREFIX}{user_id}", node)
+                    await pipe.execute()
+            self.pruned_routes += len(dead)
+        return routes
+
+    async def _beat(self):
+        await redis_client.set(f"{NODE_ALIVE_KEY_PREFIX}{self.node_id}", "1", ttl=NODE_ALIVE_TTL)
+
+    async def _heartbeat_loop(self):
+        while True:
+            await asyncio.sleep(NODE_HEARTBEAT_INTERVAL)
+            try:
+                await self._beat()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Node heartbeat failed: {e}")
+
+    def invalidate(self, user_id: str):
+        self._remote_nodes.invalidate(user_id)
+
+    async def _announce(self, user_id: str):
+        from app.services.cluster_events import cluster_events
+        await cluster_events.publish("route_changed", {"user_id": user_id})
+
+# Global routing registry instance
+routing_registry = RoutingRegistry()
@@ -1,6 +1,8 @@
 from app.models.settings import UserSetting
 from app.database import get_database
 from datetime import datetime
+from pymongo import ASCENDING, IndexModel
+from app.utils.indexes import declare_indexes
 
 class SettingsService:
     def __init__(self):
@@ -23,3 +25,8 @@ class SettingsService:
         return True
 
 settings_service = SettingsService()
+
+declare_indexes(
+    "configuration_settings",
+    IndexModel([("user_id", ASCENDING), ("setting_key", ASCENDING)], unique=True)
+)
@@ -0,0 +1,125 @@
+from app.utils.query_metrics import start_background_task
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+import asyncio
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+# Minimum seconds between two announced transitions for one (user, conversation)
+TYPING_THROTTLE_INTERVAL = float(os.getenv("TYPING_THROTTLE_INTERVAL", 2))
+# Seconds without a typing frame after which the user is announced as stopped
+TYPING_EXPIRY = float(os.getenv("TYPING_EXPIRY", 5))
+TYPING_TICK_INTERVAL = float(os.getenv("TYPING_TICK_INTERVAL", 0.5))
+
+TypingKey = Tuple[str, str]
+
+class _TypingState:
+    __slots__ = ("announced", "last_seen", "last_emit")
+
+    def __init__(self):
+        self.announced = False
+        self.last_seen = 0.0
+        self.last_emit = float("-inf")
+
+class TypingCoalescer:
+    """Collapses per-keystroke typing frames into throttled typing/stopped transitions"""
+
+    def __init__(
+        self,
+        emit: Callable[[str, str, bool], Awaitable[None]],
+        throttle_interval: float = TYPING_THROTTLE_INTERVAL,
+        expiry: float = TYPING_EXPIRY,
+        tick_interval: float = TYPING_TICK_INTERVAL
+    ):
+        self._emit = emit
+        self.throttle_interval = throttle_interval
+        self.expiry = expiry
+        self.tick_interval = tick_interval
+        self._states: Dict[TypingKey, _TypingState] = {}
+        self._tick_task: Optional[asyncio.Task] = None
+
+        # Counters
+        self.received = 0
+        self.emitted = 0
+        self.coalesced = 0
+        self.expired = 0
+
+    def ensure_started(self):
+        if self._tick_task is None or self._tick_task.done():
+            self._tick_task = start_background_task(self._tick_loop())
+
+    async def stop(self):
+        if self._tick_task:
+            self._tick_task.cancel()
+            try:
+                await self._tick_task
+            except asyncio.CancelledError:
+                pass
+            self._tick_task = None
+
+    async def typing(self, user_id: str, conversation_id: str, is_typing: bool = True):
+        """Record a client typing frame; only state changes outside the throttle window are sent"""
+        self.received += 1
+        key = (user_id, conversation_id)
+        state = self._states.get(key)
+        if state is None:
+            if not is_typing:
+                # Nothing was announced, so there is nothing to stop
+                self.coalesced += 1
+                return
+            state = self._states[key] = _TypingState()
+            self.ensure_started()
+
+        now = time.monotonic()
+        if is_typing:
+            state.last_seen = now
+        else:
+            # An explicit stop only brings the expiry forward; the tick still throttles it
+            state.last_seen = now - self.expiry
+
+        if is_typing != state.announced and now - state.last_emit >= self.throttle_interval:
+            await self._announce(key, state, is_typing, now)
+        else:
+            self.coalesced += 1
+
+    async def flush_due(self):
+        """Announce expiries and transitions held back by the throttle"""
+        now = time.monotonic()
+        for key, state in list(self._states.items()):
+            is_typing = now - state.last_seen < self.expiry
+            if is_typing != state.announced and now - state.last_emit >= self.throttle_interval:
+                if not is_typing:
+                    self.expired += 1
+                await self._announce(key, state, is_typing, now)
+            if not state.announced and not is_typing:
+                self._states.pop(key, None)
+
+    async def _announce(self, key: TypingKey, state: _TypingState, is_typing: bool, now: float):
+        state.announced = is_typing
+        state.last_emit = now
+        self.emitted += 1
+        user_id, conversation_id = key
+        await self._emit(user_id, conversation_id, is_typing)
+
+    async def _tick_loop(self):
+        while True:
+            await asyncio.sleep(self.tick_interval)
+            try:
+                await self.flush_due()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Typing indicator flush failed: {e}")
+
+    def get_stats(self) -> dict:
+        return {
+            "throttle_interval": self.throttle_interval,
+            "expiry": self.expiry,
+            "active": len(self._states),
+            "received": self.received,
+            "emitted": self.emitted,
+            "coalesced": self.coalesced,
+            "expired": self.expired
+        }
@@ -0,0 +1,116 @@
+from datetime import date, datetime
+from enum import Enum
+from typing import Any, Iterable, Optional, Tuple, Union
+import json
+
+from bson import ObjectId
+
+try:
+    import msgpack
+except ImportError:  # Optional dependency; JSON is always available
+    msgpack = None
+
+JSON_PROTOCOL = "json"
+MSGPACK_SUBPROTOCOL = "msgpack"
+
+# Separates the origin node and routing target from the payload in Redis messages
+ENVELOPE_SEPARATOR = "\n"
+
+
+def _default(obj: Any):
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, Enum):
+        return obj.value
+    raise TypeError(f"Object of type {type(obj).__name__} is not serializable")
+
+
+class Frame:
+    """An outbound message encoded at most once per wire format and shared by all recipients"""
+
+    __slots__ = ("_message", "_text", "_binary", "_event_id")
+
+    def __init__(self, message: Optional[dict] = None, text: Optional[str] = None):
+        self._message = message
+        self._text = text
+        self._binary: Optional[bytes] = None
+        self._event_id: Optional[str] = None
+
+    @property
+    def message(self) -> dict:
+        if self._message is None:
+            self._message = json.loads(self._text)
+        return self._message
+
+    @property
+    def text(self) -> str:
+        if self._text is None:
+            self._text = json.dumps(self._message, default=_default)
+        return self._text
+
+    @property
+    def binary(self) -> bytes:
+        if self._binary is None:
+            self._binary = msgpack.packb(self.message, default=_default)
+        return self._binary
+
+    @property
+    def event_id(self) -> Optional[str]:
+        """Durable stream ID carried by this frame, if any"""
+        if self._event_id is None and self._message is None and '"event_id"' not in self._text:
+            return None
+        if self._event_id is None:
+            self._event_id = self.message.get("event_id")
+        return self._event_id
+
+    def with_event_id(self, event_id: str) -> "Frame":
+        """Copy of this frame tagged with a durable stream event ID"""
+        if self._text is not None:
+            # Splice the field into the encoded object instead of re-encoding it
+            body = self._text.rstrip()[:-1].rstrip()
+            separator = "" if body.endswith("{") else ","
+            frame = Frame(text=f"{body}{separator}\"event_id\":{json.dumps(event_id)}}}")
+        else:
+            frame = Frame({**self._message, "event_id": event_id})
+        frame._event_id = event_id
+        return frame
+
+    def encode(self, protocol: str) -> Union[str, bytes]:
+        """Return the payload for a connection speaking the given protocol"""
+        if protocol == MSGPACK_SUBPROTOCOL:
+            return self.binary
+        return self.text
+
+
+def as_frame(message: Union[dict, Frame]) -> Frame:
+    return message if isinstance(message, Frame) else Frame(message)
+
+
+def negotiate_subprotocol(requested: Iterable[str]) -> Optional[str]:
+    """Pick the WebSocket subprotocol to accept from the client's offer"""
+    if msgpack is not None and MSGPACK_SUBPROTOCOL in requested:
+        return MSGPACK_SUBPROTOCOL
+    return None
+
+
+def decode_inbound(text: Optional[str] = None, data: Optional[bytes] = None) -> dict:
+    """Decode a client frame sent as JSON text or MessagePack bytes"""
+    if data is not None:
+        if msgpack is None:
+            raise ValueError("Binary frames require the msgpack subprotocol")
+        return msgpack.unpackb(data)
+    return json.loads(text)
+
+
+def pack_envelope(origin: str, frame: Frame, target: str = "") -> str:
+    """Prefix the already-encoded payload with its origin node and a channel-specific target for Redis"""
+    return f"{origin}{ENVELOPE_SEPARATOR}{target}{ENVELOPE_SEPARATOR}{frame.text}"
+
+
+def unpack_envelope(data: str) -> Tuple[str, str, Frame]:
+    """Split a Redis message into origin, target and a frame that reuses the encoded payload"""
+    origin, _, rest = data.partition(ENVELOPE_SEPARATOR)
+    target, _, text = rest.partition(ENVELOPE_SEPARATOR)
+    return origin, target, Frame(text=text)
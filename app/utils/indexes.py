@@ -0,0 +1,124 @@
+from pymongo import IndexModel
+from typing import Dict, Iterable, List
+import importlib
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+MONGO_ENSURE_INDEXES = os.getenv("MONGO_ENSURE_INDEXES", "true").lower() in ("1", "true", "yes")
+
+# Drop indexes that exist in MongoDB but are declared nowhere (off by default; they are only reported)
+DROP_UNDECLARED_INDEXES = os.getenv("MONGO_DROP_UNDECLARED_INDEXES", "false").lower() in ("1", "true", "yes")
+
+# Modules that declare indexes next to their queries; imported before reconciling
+INDEX_OWNERS = [
+    "app.services.auth_service",
+    "app.services.capsule_scheduler",
+    "app.services.chat_service",
+    "app.services.connection_manager",
+    "app.services.conversation_channels",
+    "app.services.notification_service",
+    "app.services.permission_service",
+    "app.services.settings_service",
+    "app.routers.capsules",
+    "app.routers.friends",
+    "app.routers.users",
+    "app.routers.vault",
+]
+
+# collection -> indexes declared by the modules that query it
+_registry: Dict[str, List[IndexModel]] = {}
+
+# Result of the last reconciliation, exposed through /api/metrics
+last_report: Dict[str, dict] = {}
+
+
+def declare_indexes(collection: str, *indexes: IndexModel):
+    """Register indexes that support a module's queries on collection"""
+    declared = _registry.setdefault(collection, [])
+    names = {index.document["name"] for index in declared}
+    for index in indexes:
+        if index.document["name"] not in names:
+            declared.append(index)
+            names.add(index.document["name"])
+
+
+def load_index_declarations(modules: Iterable[str] = INDEX_OWNERS):
+    """Import the owning modules so their declarations are registered"""
+    for module in modules:
+        try:
+            importlib.import_module(module)
+        except Exception as e:
+            logger.warning(f"Could not load index declarations from {module}: {e}")
+
+
+def declared_indexes() -> Dict[str, List[IndexModel]]:
+    return {collection: list(indexes) for collection, indexes in _registry.items()}
+
+
+def _options(spec: dict) -> dict:
+    """Options that change an index's behaviour, for comparing declared and existing indexes"""
+    return {
+        "unique": bool(spec.get("unique", False)),
+        "sparse": bool(spec.get("sparse", False)),
+        "expireAfterSeconds": spec.get("expireAfterSeconds"),
+    }
+
+
+async def ensure_indexes(db) -> Dict[str, dict]:
+    """Create missing declared indexes and report drift between the registry and MongoDB"""
+    report: Dict[str, dict] = {}
+    for collection, indexes in _registry.items():
+        entry = {"created": [], "conflicts": [], "undeclared": [], "dropped": [], "errors": []}
+        try:
+            existing = await db[collection].index_information()
+        except Exception as e:
+            entry["errors"].append(str(e))
+            report[collection] = entry
+            continue
+
+        existing_by_key = {tuple(info["key"]): (name, info) for name, info in existing.items()}
+        declared_keys = set()
+        missing = []
+        for index in indexes:
+            document = index.document
+            key = tuple(document["key"].items())
+            declared_keys.add(key)
+            if key not in existing_by_key:
+                missing.append(index)
+                continue
+            name, info = existing_by_key[key]
+            if _options(info) != _options(document):
+                # Never rebuilt automatically; changing options needs a deliberate drop
+                entry["conflicts"].append(f"{name}: existing {_options(info)} != declared {_options(document)}")
+
+        for index in missing:
+            try:
+                await db[collection].create_indexes([index])
+                entry["created"].append(index.document["name"])
+            except Exception as e:
+                entry["errors"].append(f"{index.document['name']}: {e}")
+
+        for key, (name, _) in existing_by_key.items():
+            if name == "_id_" or key in declared_keys:
+                continue
+            entry["undeclared"].append(name)
+            if DROP_UNDECLARED_INDEXES:
+                try:
+                    await db[collection].drop_index(name)
+                    entry["dropped"].append(name)
+                except Exception as e:
+                    entry["errors"].append(f"{name}: {e}")
+
+        report[collection] = entry
+        for kind in ("created", "dropped"):
+            if entry[kind]:
+                logger.info(f"Indexes {kind} on {collection}: {', '.join(entry[kind])}")
+        for kind in ("conflicts", "undeclared", "errors"):
+            if entry[kind]:
+                logger.warning(f"Index drift on {collection} ({kind}): {'; '.join(entry[kind])}")
+
+    last_report.clear()
+    last_report.update(report)
+    return report
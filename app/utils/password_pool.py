@@ -0,0 +1,111 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, List, Optional
+import asyncio
+import os
+import time
+
+from app.utils.security import get_password_hash, verify_password
+
+PASSWORD_POOL_WORKERS = int(os.getenv("PASSWORD_POOL_WORKERS", min(4, os.cpu_count() or 1)))
+# Jobs running or waiting beyond this are rejected instead of queued
+PASSWORD_POOL_MAX_PENDING = int(os.getenv("PASSWORD_POOL_MAX_PENDING", PASSWORD_POOL_WORKERS * 8))
+# Threads shared by bulk provisioning requests; kept below the core count so logins still get CPU
+PASSWORD_BULK_WORKERS = int(os.getenv("PASSWORD_BULK_WORKERS", max(1, (os.cpu_count() or 1) // 2)))
+
+
+class PasswordPoolOverloaded(Exception):
+    """Raised when the hashing pool is at its admission limit"""
+
+
+class PasswordPool:
+    """Bounded thread pool that keeps bcrypt work off the event loop"""
+
+    def __init__(self, workers: int = PASSWORD_POOL_WORKERS, max_pending: int = PASSWORD_POOL_MAX_PENDING):
+        self.workers = workers
+        self.max_pending = max_pending
+        # bcrypt releases the GIL, so threads hash in parallel
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self._bulk_executor: Optional[ThreadPoolExecutor] = None
+        self.pending = 0
+
+        # Counters
+        self.completed = 0
+        self.rejected = 0
+        self.total_queue_time = 0.0
+        self.max_queue_time = 0.0
+        self.total_run_time = 0.0
+
+    async def run(self, func: Callable[..., Any], *args) -> Any:
+        """Run func in the pool, failing fast when too much work is already waiting"""
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise PasswordPoolOverloaded(f"{self.pending} password jobs pending")
+
+        submitted_at = time.perf_counter()
+
+        def job():
+            started_at = time.perf_counter()
+            result = func(*args)
+            return result, started_at - submitted_at, time.perf_counter() - started_at
+
+        future = asyncio.get_running_loop().run_in_executor(self._executor, job)
+        self.pending += 1
+        # Released when the thread finishes, not when the caller stops waiting
+        future.add_done_callback(self._job_done)
+        result, _, _ = await asyncio.shield(future)
+        return result
+
+    def _job_done(self, future: asyncio.Future):
+        self.pending -= 1
+        if future.cancelled() or future.exception() is not None:
+            return
+        _, queue_time, run_time = future.result()
+        self.completed += 1
+        self.total_queue_time += queue_time
+        self.total_run_time += run_time
+        if queue_time > self.max_queue_time:
+            self.max_queue_time = queue_time
+
+    async def hash(self, password: str) -> str:
+        return await self.run(get_password_hash, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self.run(verify_password, plain_password, hashed_password)
+
+    async def hash_many(self, passwords: List[str], workers: Optional[int] = None) -> List[str]:
+        """Hash a batch outside the interactive pool so bulk jobs never take its admission slots"""
+        loop = asyncio.get_running_loop()
+        if workers:
+            # An explicit size gets its own executor; the provisioning CLI runs in its own process
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt-bulk") as executor:
+                return list(await asyncio.gather(
+                    *(loop.run_in_executor(executor, get_password_hash, password) for password in passwords)
+                ))
+
+        if self._bulk_executor is None:
+            self._bulk_executor = ThreadPoolExecutor(max_workers=PASSWORD_BULK_WORKERS, thread_name_prefix="bcrypt-bulk")
+        return list(await asyncio.gather(
+            *(loop.run_in_executor(self._bulk_executor, get_password_hash, password) for password in passwords)
+        ))
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        if self._bulk_executor is not None:
+            self._bulk_executor.shutdown(wait=False, cancel_futures=True)
+
+    def get_stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "bulk_workers": PASSWORD_BULK_WORKERS,
+            "pending": self.pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "avg_queue_ms": (self.total_queue_time / self.completed * 1000) if self.completed else 0.0,
+            "max_queue_ms": self.max_queue_time * 1000,
+            "avg_run_ms": (self.total_run_time / self.completed * 1000) if self.completed else 0.0,
+        }
+
+
+# Global password hashing pool
+password_pool = PasswordPool()
@@ -0,0 +1,99 @@
+from pymongo import monitoring
+import threading
+import time
+
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """Connection pool counters fed by pymongo pool events (called from driver threads)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Check-out start time for the connection the current thread is waiting for
+        self._local = threading.local()
+        self.connections = 0
+        self.checked_out = 0
+        self.max_checked_out = 0
+        self.waiters = 0
+        self.max_waiters = 0
+        self.checkouts = 0
+        self.checkout_failures = 0
+        self.pool_clears = 0
+        self.total_wait_time = 0.0
+        self.max_wait_time = 0.0
+
+    def connection_check_out_started(self, event):
+        self._local.started = time.perf_counter()
+        with self._lock:
+            self.waiters += 1
+            if self.waiters > self.max_waiters:
+                self.max_waiters = self.waiters
+
+    def connection_checked_out(self, event):
+        wait_time = self._finish_wait()
+        with self._lock:
+            self.waiters -= 1
+            self.checkouts += 1
+            self.checked_out += 1
+            if self.checked_out > self.max_checked_out:
+                self.max_checked_out = self.checked_out
+            self.total_wait_time += wait_time
+            if wait_time > self.max_wait_time:
+                self.max_wait_time = wait_time
+
+    def connection_check_out_failed(self, event):
+        self._finish_wait()
+        with self._lock:
+            self.waiters -= 1
+            self.checkout_failures += 1
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_out -= 1
+
+    def connection_created(self, event):
+        with self._lock:
+            self.connections += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.connections -= 1
+
+    def connection_ready(self, event):
+        pass
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self.pool_clears += 1
+
+    def pool_closed(self, event):
+        pass
+
+    def _finish_wait(self) -> float:
+        started = getattr(self._local, "started", None)
+        self._local.started = None
+        return time.perf_counter() - started if started is not None else 0.0
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                "connections": self.connections,
+                "checked_out": self.checked_out,
+                "max_checked_out": self.max_checked_out,
+                "waiters": self.waiters,
+                "max_waiters": self.max_waiters,
+                "checkouts": self.checkouts,
+                "checkout_failures": self.checkout_failures,
+                "pool_clears": self.pool_clears,
+                "avg_wait_ms": (self.total_wait_time / self.checkouts * 1000) if self.checkouts else 0.0,
+                "max_wait_ms": self.max_wait_time * 1000,
+            }
+
+
+# Global pool metrics, registered on the application's Mongo client
+pool_metrics = PoolMetrics()
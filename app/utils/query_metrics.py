@@ -0,0 +1,220 @@
+from contextvars import Context, ContextVar
+from pymongo import monitoring
+from starlette.routing import Match
+from typing import Any, Dict, Optional, Tuple
+import asyncio
+import json
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERY_MS = float(os.getenv("MONGO_SLOW_QUERY_MS", 100))
+
+# Label for commands issued outside a request, e.g. by background tasks
+BACKGROUND_ROUTE = "background"
+
+# Route template of the request being served; copied into Motor's executor threads
+current_route: ContextVar[Optional[str]] = ContextVar("current_route", default=None)
+
+
+class RequestDbStats:
+    """Database time accumulated by one request"""
+
+    __slots__ = ("commands", "duration")
+
+    def __init__(self):
+        self.commands = 0
+        self.duration = 0.0
+
+
+request_db_stats: ContextVar[Optional[RequestDbStats]] = ContextVar("request_db_stats", default=None)
+
+
+def start_background_task(coro) -> asyncio.Task:
+    """Create a long-lived task in an empty context, so a request that starts it does not lend it its route"""
+    return asyncio.create_task(coro, context=Context())
+
+# Commands whose filter is reported as the query shape
+_FILTER_FIELDS = {
+    "find": "filter",
+    "count": "query",
+    "distinct": "query",
+    "findAndModify": "query",
+    "aggregate": "pipeline",
+}
+
+
+def query_shape(value: Any) -> Any:
+    """Replace literal values with placeholders, keeping field names and operators"""
+    if isinstance(value, dict):
+        return {key: query_shape(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        nested = [query_shape(item) for item in value if isinstance(item, (dict, list, tuple))]
+        return nested[:10] if nested else "?"
+    return "?"
+
+
+def _command_shape(command_name: str, command: dict) -> Any:
+    if command_name in _FILTER_FIELDS:
+        return query_shape(command.get(_FILTER_FIELDS[command_name], {}))
+    if command_name == "update":
+        return [query_shape(update.get("q", {})) for update in command.get("updates", [])[:10]]
+    if command_name == "delete":
+        return [query_shape(delete.get("q", {})) for delete in command.get("deletes", [])[:10]]
+    return None
+
+
+def _documents_returned(command_name: str, reply: dict) -> int:
+    cursor = reply.get("cursor")
+    if isinstance(cursor, dict):
+        return len(cursor.get("firstBatch") or cursor.get("nextBatch") or [])
+    if command_name == "count":
+        return reply.get("n", 0)
+    if command_name == "distinct":
+        return len(reply.get("values", []))
+    if command_name == "findAndModify":
+        return 1 if reply.get("value") else 0
+    return 0
+
+
+class _Aggregate:
+    __slots__ = ("count", "failures", "total", "max", "documents")
+
+    def __init__(self):
+        self.count = 0
+        self.failures = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.documents = 0
+
+    def add(self, duration: float, documents: int, failed: bool = False):
+        self.count += 1
+        self.total += duration
+        self.documents += documents
+        if failed:
+            self.failures += 1
+        if duration > self.max:
+            self.max = duration
+
+    def as_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "failures": self.failures,
+            "total_ms": self.total * 1000,
+            "avg_ms": (self.total / self.count * 1000) if self.count else 0.0,
+            "max_ms": self.max * 1000,
+            "documents": self.documents,
+        }
+
+
+class QueryMetrics(monitoring.CommandListener):
+    """Per-route and per-collection command timings fed by pymongo command events"""
+
+    def __init__(self, slow_query_ms: float = SLOW_QUERY_MS):
+        self.slow_query_seconds = slow_query_ms / 1000
+        self._lock = threading.Lock()
+        # (connection, request) -> (route, collection, command, request stats)
+        self._inflight: Dict[Tuple[Any, int], tuple] = {}
+        self._by_route: Dict[str, _Aggregate] = {}
+        self._by_collection: Dict[str, _Aggregate] = {}
+        self.slow_queries = 0
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        if event.command_name == "getMore":
+            collection = event.command.get("collection")
+        if not isinstance(collection, str):
+            # Handshakes, pings and other commands not tied to a collection
+            return
+        route = current_route.get() or BACKGROUND_ROUTE
+        with self._lock:
+            self._inflight[(event.connection_id, event.request_id)] = (
+                route, collection, event.command, request_db_stats.get()
+            )
+
+    def succeeded(self, event):
+        self._finish(event, _documents_returned(event.command_name, event.reply), failed=False)
+
+    def failed(self, event):
+        self._finish(event, 0, failed=True)
+
+    def _finish(self, event, documents: int, failed: bool):
+        with self._lock:
+            inflight = self._inflight.pop((event.connection_id, event.request_id), None)
+        if inflight is None:
+            return
+        route, collection, command, stats = inflight
+        duration = event.duration_micros / 1_000_000
+        operation = f"{event.command_name} {collection}"
+
+        with self._lock:
+            self._by_route.setdefault(route, _Aggregate()).add(duration, documents, failed)
+            self._by_collection.setdefault(operation, _Aggregate()).add(duration, documents, failed)
+            if stats is not None:
+                stats.commands += 1
+                stats.duration += duration
+
+        if duration >= self.slow_query_seconds:
+            self.slow_queries += 1
+            shape = json.dumps(_command_shape(event.command_name, command), default=str)
+            logger.warning(
+                f"Slow MongoDB {operation} took {duration * 1000:.1f}ms on {route} "
+                f"({documents} documents): {shape}"
+            )
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                "slow_query_ms": self.slow_query_seconds * 1000,
+                "slow_queries": self.slow_queries,
+                "routes": {route: aggregate.as_dict() for route, aggregate in self._by_route.items()},
+                "operations": {name: aggregate.as_dict() for name, aggregate in self._by_collection.items()},
+            }
+
+
+class DbTimingMiddleware:
+    """Tags each request with its route template and reports its DB time in Server-Timing"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        route_token = current_route.set(self._match_route(scope))
+        stats = RequestDbStats()
+        stats_token = request_db_stats.set(stats)
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start" and stats.commands:
+                headers = list(message.get("headers", []))
+                headers.append((
+                    b"server-timing",
+                    f'db;dur={stats.duration * 1000:.2f};desc="{stats.commands} queries"'.encode()
+                ))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            current_route.reset(route_token)
+            request_db_stats.reset(stats_token)
+
+    @staticmethod
+    def _match_route(scope) -> str:
+        app = scope.get("app")
+        router = getattr(app, "router", None)
+        for route in getattr(router, "routes", []):
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return f"{scope.get('method', 'WS')} {route.path}"
+        return f"{scope.get('method', 'WS')} unmatched"
+
+
+# Global command metrics, registered on the application's Mongo client
+query_metrics = QueryMetrics()
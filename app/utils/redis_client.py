@@ -1,6 +1,7 @@
 import redis.asyncio as redis
 import json
-from typing import Optional
+import asyncio
+from typing import List, Optional, Tuple
 import os
 from dotenv import load_dotenv
 
@@ -9,16 +10,24 @@ load_dotenv()
 class RedisClient:
     def __init__(self):
         self.redis_url = os.getenv("REDIS_URL", "redis://localhost:6379")
+        # "redis", or "fake" for an in-process fakeredis server (benchmarks and CI only)
+        self.backend = os.getenv("REDIS_BACKEND", "redis").lower()
         self.client: Optional[redis.Redis] = None
         self.pubsub: Optional[redis.PubSub] = None
     
     async def connect(self):
         """Connect to Redis"""
-        self.client = redis.from_url(
-            self.redis_url,
-            encoding="utf-8",
-            decode_responses=True
-        )
+        if self.backend == "fake":
+            import fakeredis.aioredis
+            self.client = fakeredis.aioredis.FakeRedis(encoding="utf-8", decode_responses=True)
+        elif self.backend == "redis":
+            self.client = redis.from_url(
+                self.redis_url,
+                encoding="utf-8",
+                decode_responses=True
+            )
+        else:
+            raise ValueError(f"Unknown REDIS_BACKEND: {self.backend}")
         self.pubsub = self.client.pubsub()
     
     async def disconnect(self):
@@ -33,15 +42,30 @@ class RedisClient:
         if self.client:
             await self.client.publish(channel, json.dumps(message))
     
-    async def subscribe(self, channel: str):
-        """Subscribe to channel"""
-        if self.pubsub:
-            await self.pubsub.subscribe(channel)
+    async def publish_raw(self, channel: str, data: str):
+        """Publish an already-encoded payload to channel"""
+        if self.client:
+            await self.client.publish(channel, data)
     
-    async def unsubscribe(self, channel: str):
-        """Unsubscribe from channel"""
-        if self.pubsub:
-            await self.pubsub.unsubscribe(channel)
+    async def publish_many(self, messages: List[Tuple[str, str]], batch_size: int = 1000):
+        """Publish already-encoded payloads in pipelined batches"""
+        if not self.client:
+            return
+        for start in range(0, len(messages), batch_size):
+            async with self.client.pipeline(transaction=False) as pipe:
+                for channel, data in messages[start:start + batch_size]:
+                    pipe.publish(channel, data)
+                await pipe.execute()
+    
+    async def subscribe(self, *channels: str):
+        """Subscribe to one or more channels in a single command"""
+        if self.pubsub and channels:
+            await self.pubsub.subscribe(*channels)
+    
+    async def unsubscribe(self, *channels: str):
+        """Unsubscribe from one or more channels (never all channels when none are given)"""
+        if self.pubsub and channels:
+            await self.pubsub.unsubscribe(*channels)
     
     async def get_message(self):
         """Get message from subscribed channels"""
@@ -51,6 +75,76 @@ class RedisClient:
                 return json.loads(message["data"])
         return None
     
+    async def read_message(self, timeout: float = 1.0) -> Optional[dict]:
+        """Block until a pub/sub message arrives or the timeout expires; data is left encoded"""
+        if self.pubsub and self.pubsub.subscribed:
+            message = await self.pubsub.get_message(ignore_subscribe_messages=True, timeout=timeout)
+            if message and message["data"]:
+                return {"channel": message["channel"], "data": message["data"]}
+            return None
+        # Nothing subscribed yet; wait instead of spinning
+        await asyncio.sleep(timeout)
+        return None
+    
+    async def get(self, key: str) -> Optional[str]:
+        """Get a string key"""
+        if self.client:
+            return await self.client.get(key)
+        return None
+    
+    async def set(self, key: str, value: str, ttl: Optional[int] = None):
+        """Set a string key, optionally expiring after ttl seconds"""
+        if self.client:
+            await self.client.set(key, value, ex=ttl)
+    
+    async def delete(self, key: str):
+        """Delete a key"""
+        if self.client:
+            await self.client.delete(key)
+    
+    async def hset(self, key: str, field: str, value: str, ttl: Optional[int] = None):
+        """Set a hash field, optionally refreshing the key's expiry"""
+        if self.client:
+            async with self.client.pipeline(transaction=False) as pipe:
+                pipe.hset(key, field, value)
+                if ttl:
+                    pipe.expire(key, ttl)
+                await pipe.execute()
+    
+    async def hdel(self, key: str, field: str):
+        """Delete a hash field"""
+        if self.client:
+            await self.client.hdel(key, field)
+    
+    async def hkeys(self, key: str) -> List[str]:
+        """Return the fields of a hash"""
+        if self.client:
+            return await self.client.hkeys(key)
+        return []
+    
+    def pipeline(self):
+        """Return a non-transactional pipeline, or None when not connected"""
+        if self.client:
+            return self.client.pipeline(transaction=False)
+        return None
+    
+    async def mget(self, keys: List[str]) -> List[Optional[str]]:
+        """Get many keys in one round trip"""
+        if self.client and keys:
+            return await self.client.mget(keys)
+        return [None] * len(keys)
+    
+    async def zrangebyscore(self, key: str, min_score, max_score) -> List[str]:
+        """Return sorted set members within a score range"""
+        if self.client:
+            return await self.client.zrangebyscore(key, min_score, max_score)
+        return []
+    
+    async def zremrangebyscore(self, key: str, min_score, max_score):
+        """Remove sorted set members within a score range"""
+        if self.client:
+            await self.client.zremrangebyscore(key, min_score, max_score)
+    
     async def set_user_online(self, user_id: str):
         """Set user online status"""
         if self.client:
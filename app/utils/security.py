@@ -2,10 +2,26 @@ from passlib.context import CryptContext
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
 from typing import Optional
+from dotenv import load_dotenv
+from app.utils.ttl_cache import TTLCache
+import hashlib
 import os
+import time
+
+load_dotenv()
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# Key material is read once at import instead of on every sign/verify
+JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY", "CHANGEME")
+JWT_ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
+
+# sha256(token) -> decoded payload; entries never outlive the token's exp
+_token_cache = TTLCache(
+    maxsize=int(os.getenv("JWT_CACHE_SIZE", 10000)),
+    ttl=float(os.getenv("JWT_CACHE_MAX_TTL", 900))
+)
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
@@ -19,20 +35,22 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     else:
         expire = datetime.utcnow() + timedelta(minutes=15)
     to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(
-        to_encode,
-        os.getenv("JWT_SECRET_KEY", "CHANGEME"),
-        algorithm=os.getenv("JWT_ALGORITHM", "HS256")
-    )
+    encoded_jwt = jwt.encode(to_encode, JWT_SECRET_KEY, algorithm=JWT_ALGORITHM)
     return encoded_jwt
 
 def verify_token(token: str) -> Optional[dict]:
+    """Decode and verify a token, reusing the result for repeat presentations until it expires"""
+    digest = hashlib.sha256(token.encode()).digest()
+    payload = _token_cache.get(digest)
+    if payload is not None:
+        return dict(payload)
+
     try:
-        payload = jwt.decode(
-            token,
-            os.getenv("JWT_SECRET_KEY", "CHANGEME"),
-            algorithms=[os.getenv("JWT_ALGORITHM", "HS256")]
-        )
-        return payload
+        payload = jwt.decode(token, JWT_SECRET_KEY, algorithms=[JWT_ALGORITHM])
     except JWTError:
         return None
+
+    exp = payload.get("exp")
+    ttl = None if exp is None else min(float(exp) - time.time(), _token_cache.ttl)
+    _token_cache.set(digest, payload, ttl=ttl)
+    return dict(payload)
@@ -0,0 +1,497 @@
+"""WebSocket fan-out load test.
+
+Starts the /ws stack in-process against a local Redis (a spawned redis-server
+binary, fakeredis, or an explicit URL), opens simulated clients in worker
+processes and drives chat, typing and presence traffic through
+app.services.connection_manager. Reports delivery latency percentiles,
+throughput and server memory per connection, and can compare a run against a
+saved baseline so regressions fail the command.
+
+    python -m benchmarks.ws_fanout --clients 2000 --duration 30 --output base.json
+    python -m benchmarks.ws_fanout --clients 2000 --duration 30 --compare base.json
+
+By default MongoDB is the in-memory mongomock backend (MONGO_BACKEND=memory),
+seeded with the generated conversations, and Redis falls back to fakeredis
+when no redis-server binary is found, so the run needs no external services.
+Conversation participants and friend lists are also primed in the connection
+manager's caches, so fan-out is measured on the cached path.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import resource
+import shutil
+import socket
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+# Keep primed caches alive for the whole run; must be set before app imports
+os.environ.setdefault("CONVERSATION_CACHE_TTL", "86400")
+os.environ.setdefault("FRIEND_CACHE_TTL", "86400")
+os.environ.setdefault("JWT_SECRET_KEY", "benchmark-secret")
+
+LATENCY_SAMPLE_LIMIT = 100000
+
+# Metrics compared against a baseline and whether lower values are better
+COMPARED_METRICS = {
+    "chat_p50_ms": True,
+    "chat_p99_ms": True,
+    "memory_per_connection_kb": True,
+    "messages_per_sec": False,
+    "chat_delivery_ratio": False,
+}
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _raise_fd_limit():
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+# --- Simulated clients (worker processes) ---------------------------------
+
+async def _run_client(url: str, user: dict, params: dict, stats: dict, stop_at: float, ready: asyncio.Event):
+    import websockets
+
+    subprotocols = ["msgpack"] if params["msgpack"] else None
+    churn = random.random() < params["churn_fraction"]
+    first = True
+
+    while time.time() < stop_at:
+        try:
+            async with websockets.connect(
+                f"{url}?token={user['token']}",
+                subprotocols=subprotocols,
+                max_queue=None,
+                ping_interval=None
+            ) as ws:
+                if first:
+                    stats["connected"] += 1
+                    if stats["connected"] == stats["assigned"]:
+                        ready.set()
+                    first = False
+                else:
+                    stats["reconnects"] += 1
+
+                reader = asyncio.create_task(_read_frames(ws, stats))
+                session_end = stop_at
+                if churn:
+                    session_end = min(stop_at, time.time() + random.uniform(0.5, 1.5) * params["churn_interval"])
+                await _send_typing(ws, user, params, session_end)
+                reader.cancel()
+        except Exception as e:
+            stats["errors"] += 1
+            if first:
+                stats["connected"] += 1
+                if stats["connected"] == stats["assigned"]:
+                    ready.set()
+                first = False
+            stats["last_error"] = repr(e)
+            await asyncio.sleep(0.5)
+
+
+async def _read_frames(ws, stats: dict):
+    from app.utils.frames import decode_inbound
+
+    async for raw in ws:
+        now = time.time()
+        message = decode_inbound(data=raw) if isinstance(raw, bytes) else json.loads(raw)
+        message_type = message.get("type", "unknown")
+        stats["received"][message_type] = stats["received"].get(message_type, 0) + 1
+        sent_at = message.get("bench_ts")
+        if sent_at is not None:
+            latencies = stats["latencies"]
+            stats["latency_count"] += 1
+            if len(latencies) < LATENCY_SAMPLE_LIMIT:
+                latencies.append(now - sent_at)
+            else:
+                # Reservoir sampling keeps the percentile estimate unbiased
+                slot = random.randrange(stats["latency_count"])
+                if slot < LATENCY_SAMPLE_LIMIT:
+                    latencies[slot] = now - sent_at
+
+
+async def _send_typing(ws, user: dict, params: dict, until: float):
+    interval = params["typing_interval"]
+    while time.time() < until:
+        if interval > 0 and user["conversations"]:
+            await asyncio.sleep(random.uniform(0.5, 1.5) * interval)
+            await ws.send(json.dumps({
+                "type": "typing",
+                "conversation_id": random.choice(user["conversations"]),
+                "is_typing": True
+            }))
+        else:
+            await asyncio.sleep(min(1.0, max(0.0, until - time.time())))
+
+
+async def _client_main(url: str, users: List[dict], params: dict, conn):
+    _raise_fd_limit()
+    stats = {
+        "assigned": len(users), "connected": 0, "reconnects": 0, "errors": 0, "last_error": None,
+        "received": {}, "latencies": [], "latency_count": 0,
+    }
+    ready = asyncio.Event()
+    # Clients run until told to stop; the parent sends the real deadline after warm-up
+    stop_at = time.time() + 24 * 3600
+    tasks = []
+    for user in users:
+        tasks.append(asyncio.create_task(_run_client(url, user, params, stats, stop_at, ready)))
+        await asyncio.sleep(params["connect_delay"])
+    await ready.wait()
+    conn.send(("ready", stats["connected"]))
+
+    loop = asyncio.get_running_loop()
+    command, deadline = await loop.run_in_executor(None, conn.recv)
+    # Discard counters from the warm-up phase
+    stats["received"] = {}
+    stats["latencies"] = []
+    stats["latency_count"] = 0
+    await asyncio.sleep(max(0.0, deadline - time.time()))
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    conn.send(("result", stats))
+
+
+def _client_worker(url: str, users: List[dict], params: dict, conn):
+    asyncio.run(_client_main(url, users, params, conn))
+
+
+# --- In-process server ----------------------------------------------------
+
+async def _start_redis(mode: str):
+    """Point the shared RedisClient at a local Redis; returns a process to stop, if any"""
+    from app.utils.redis_client import redis_client
+
+    use_fake = mode == "fakeredis" or (mode == "auto" and not shutil.which("redis-server"))
+    if use_fake:
+        redis_client.backend = "fake"
+        await redis_client.connect()
+        return None, "fakeredis"
+
+    process = None
+    if mode in ("auto", "redis-server"):
+        port = _free_port()
+        process = subprocess.Popen(
+            ["redis-server", "--port", str(port), "--save", "", "--appendonly", "no"],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        redis_client.redis_url = f"redis://127.0.0.1:{port}"
+        label = "redis-server"
+    else:
+        redis_client.redis_url = mode
+        label = mode
+
+    for _ in range(50):
+        try:
+            await redis_client.connect()
+            await redis_client.client.ping()
+            return process, label
+        except Exception:
+            await asyncio.sleep(0.1)
+    raise RuntimeError(f"Redis at {redis_client.redis_url} did not become ready")
+
+
+def _build_population(args) -> Tuple[List[dict], Dict[str, List[str]]]:
+    from app.utils.security import create_access_token
+
+    user_ids = [f"{i:024x}" for i in range(1, args.clients + 1)]
+    users = [{"id": uid, "token": create_access_token({"sub": uid}), "conversations": []} for uid in user_ids]
+
+    conversations: Dict[str, List[str]] = {}
+    group_size = max(2, args.group_size)
+    for index, start in enumerate(range(0, len(users), group_size)):
+        members = users[start:start + group_size]
+        if len(members) < 2:
+            break
+        conversation_id = f"c{index:023x}"
+        conversations[conversation_id] = [member["id"] for member in members]
+        for member in members:
+            member["conversations"].append(conversation_id)
+    return users, conversations
+
+
+async def _seed_database(users: List[dict], conversations: Dict[str, List[str]]):
+    """Load the generated conversations into the in-memory MongoDB"""
+    from bson import ObjectId
+    from app.database import get_database
+
+    db = await get_database()
+    await db.users.insert_many([
+        {"_id": ObjectId(user["id"]), "username": f"user{index}", "is_active": True}
+        for index, user in enumerate(users)
+    ])
+    await db.conversations.insert_many([
+        {"_id": ObjectId(conversation_id), "participants": members}
+        for conversation_id, members in conversations.items()
+    ])
+
+
+def _prime_caches(users: List[dict], conversations: Dict[str, List[str]], friends: int):
+    from app.services.connection_manager import connection_manager
+
+    for conversation_id, members in conversations.items():
+        connection_manager.cache_conversation(conversation_id, members)
+
+    count = len(users)
+    for index, user in enumerate(users):
+        neighbours = {users[(index + offset) % count]["id"] for offset in range(1, friends + 1)}
+        neighbours |= {users[(index - offset) % count]["id"] for offset in range(1, friends + 1)}
+        neighbours.discard(user["id"])
+        connection_manager.friend_ids.set(user["id"], frozenset(neighbours))
+
+
+async def _drive_chat(conversations: Dict[str, List[str]], rate: float, payload_size: int, stop_at: float) -> dict:
+    from app.services.connection_manager import connection_manager
+
+    sent = 0
+    expected = 0
+    conversation_ids = list(conversations)
+    if rate <= 0 or not conversation_ids:
+        await asyncio.sleep(max(0.0, stop_at - time.time()))
+        return {"sent": 0, "expected": 0}
+
+    interval = 1.0 / rate
+    next_send = time.perf_counter()
+    text = "x" * payload_size
+    while time.time() < stop_at:
+        conversation_id = random.choice(conversation_ids)
+        members = conversations[conversation_id]
+        sender = members[0]
+        await connection_manager.send_to_conversation(
+            conversation_id,
+            {
+                "type": "new_message",
+                "conversation_id": conversation_id,
+                "sender_id": sender,
+                "content": {"text": text},
+                "bench_ts": time.time()
+            },
+            exclude_user=sender
+        )
+        sent += 1
+        expected += len(members) - 1
+        next_send += interval
+        delay = next_send - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        elif sent % 100 == 0:
+            await asyncio.sleep(0)
+    return {"sent": sent, "expected": expected}
+
+
+async def run_benchmark(args) -> dict:
+    import uvicorn
+    from fastapi import FastAPI
+    from app.routers import websocket
+    from app.services.connection_manager import connection_manager
+
+    _raise_fd_limit()
+    redis_process, redis_label = await _start_redis(args.redis)
+    users, conversations = _build_population(args)
+    if args.mongo == "memory":
+        await _seed_database(users, conversations)
+    _prime_caches(users, conversations, args.friends)
+
+    app = FastAPI()
+    app.include_router(websocket.router)
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", ws="websockets"))
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+    connection_manager.dispatcher.ensure_started()
+
+    params = {
+        "msgpack": args.msgpack,
+        "churn_fraction": args.churn,
+        "churn_interval": args.churn_interval,
+        "typing_interval": args.typing_interval,
+        "connect_delay": args.connect_delay,
+    }
+    url = f"ws://127.0.0.1:{port}/ws"
+    context = multiprocessing.get_context("spawn")
+    workers = []
+    rss_before = _rss_bytes()
+    for index in range(args.workers):
+        share = users[index::args.workers]
+        if not share:
+            continue
+        parent_conn, child_conn = context.Pipe()
+        process = context.Process(target=_client_worker, args=(url, share, params, child_conn), daemon=True)
+        process.start()
+        workers.append((process, parent_conn))
+
+    loop = asyncio.get_running_loop()
+    connected = 0
+    for _, conn in workers:
+        _, count = await loop.run_in_executor(None, conn.recv)
+        connected += count
+    await asyncio.sleep(args.warmup)
+    rss_after = _rss_bytes()
+    sockets = len(connection_manager.outbound_queues)
+
+    started = time.time()
+    stop_at = started + args.duration
+    for _, conn in workers:
+        conn.send(("go", stop_at + 1.0))
+    chat = await _drive_chat(conversations, args.chat_rate, args.payload_size, stop_at)
+    elapsed = time.time() - started
+
+    received: Dict[str, int] = {}
+    latencies: List[float] = []
+    reconnects = errors = 0
+    for process, conn in workers:
+        _, stats = await loop.run_in_executor(None, conn.recv)
+        for message_type, count in stats["received"].items():
+            received[message_type] = received.get(message_type, 0) + count
+        latencies.extend(stats["latencies"])
+        reconnects += stats["reconnects"]
+        errors += stats["errors"]
+        process.join(timeout=5)
+
+    queue_stats = [queue.get_stats() for queue in connection_manager.outbound_queues.values()]
+    dispatcher_stats = connection_manager.dispatcher.get_stats()
+
+    server.should_exit = True
+    await server_task
+    await connection_manager.dispatcher.stop()
+    if redis_process:
+        redis_process.terminate()
+
+    delivered = received.get("new_message", 0)
+    latencies_ms = [latency * 1000 for latency in latencies]
+    return {
+        "commit": _git_commit(),
+        "params": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "redis": redis_label,
+        "mongo": args.mongo if args.mongo == "memory" else "external",
+        "metrics": {
+            "clients_connected": connected,
+            "server_sockets": sockets,
+            "chat_sent": chat["sent"],
+            "chat_expected": chat["expected"],
+            "chat_delivered": delivered,
+            "chat_delivery_ratio": delivered / chat["expected"] if chat["expected"] else 0.0,
+            "chat_p50_ms": _percentile(latencies_ms, 50),
+            "chat_p99_ms": _percentile(latencies_ms, 99),
+            "chat_max_ms": max(latencies_ms) if latencies_ms else 0.0,
+            "messages_per_sec": sum(received.values()) / elapsed if elapsed else 0.0,
+            "received_by_type": received,
+            "memory_per_connection_kb": (rss_after - rss_before) / 1024 / max(1, sockets),
+            "slow_consumer_drops": sum(s["dropped"] for s in queue_stats),
+            "max_send_queue_depth": max((s["max_depth"] for s in queue_stats), default=0),
+            "dispatcher": dispatcher_stats,
+            "client_reconnects": reconnects,
+            "client_errors": errors,
+            "duration_s": elapsed,
+        },
+    }
+
+
+def compare(result: dict, baseline: dict, tolerance: float) -> List[str]:
+    """Return descriptions of metrics that regressed beyond tolerance"""
+    regressions = []
+    for name, lower_is_better in COMPARED_METRICS.items():
+        old = baseline["metrics"].get(name)
+        new = result["metrics"].get(name)
+        if not old or new is None:
+            continue
+        change = (new - old) / old
+        worse = change > tolerance if lower_is_better else change < -tolerance
+        marker = "REGRESSION" if worse else "ok"
+        print(f"  {name:28} {old:12.3f} -> {new:12.3f} ({change:+.1%}) {marker}")
+        if worse:
+            regressions.append(name)
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=1000, help="simulated WebSocket clients")
+    parser.add_argument("--workers", type=int, default=max(1, min(8, (os.cpu_count() or 2) - 1)),
+                        help="client worker processes")
+    parser.add_argument("--duration", type=float, default=20.0, help="measured seconds of traffic")
+    parser.add_argument("--warmup", type=float, default=6.0,
+                        help="seconds after connecting before measuring (covers the presence grace period)")
+    parser.add_argument("--group-size", type=int, default=10, help="participants per conversation")
+    parser.add_argument("--friends", type=int, default=10, help="friends on each side of a user in the friend ring")
+    parser.add_argument("--chat-rate", type=float, default=200.0, help="chat messages per second, server side")
+    parser.add_argument("--payload-size", type=int, default=200, help="chat message text length")
+    parser.add_argument("--typing-interval", type=float, default=2.0,
+                        help="mean seconds between typing frames per client (0 disables)")
+    parser.add_argument("--churn", type=float, default=0.05, help="fraction of clients that keep reconnecting")
+    parser.add_argument("--churn-interval", type=float, default=5.0, help="mean session length of churning clients")
+    parser.add_argument("--connect-delay", type=float, default=0.001, help="pause between client connects")
+    parser.add_argument("--msgpack", action="store_true", help="negotiate the msgpack subprotocol")
+    parser.add_argument("--redis", default="auto",
+                        help="auto, redis-server, fakeredis or a redis:// URL (auto prefers a redis-server binary)")
+    parser.add_argument("--mongo", default="memory",
+                        help="memory (in-process mongomock, seeded with the generated data) or a mongodb:// URL")
+    parser.add_argument("--output", help="write the JSON result here")
+    parser.add_argument("--compare", help="baseline JSON result to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed relative regression")
+    args = parser.parse_args(argv)
+
+    # app.database reads its settings at import, which happens inside run_benchmark
+    if args.mongo == "memory":
+        os.environ["MONGO_BACKEND"] = "memory"
+    else:
+        os.environ["MONGODB_URL"] = args.mongo
+
+    result = asyncio.run(run_benchmark(args))
+    print(json.dumps(result, indent=2, default=str))
+
+    if args.output:
+        with open(args.output, "w") as out:
+            json.dump(result, out, indent=2, default=str)
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+        print(f"Compared with {args.compare} (commit {baseline.get('commit')}):")
+        if compare(result, baseline, args.tolerance):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
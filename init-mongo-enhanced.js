@@ -143,6 +143,8 @@ remainingCollections.forEach(collection => {
 });
 
 // Create comprehensive indexes
+// The application also declares its indexes in Python (app/utils/indexes.py)
+// and reconciles them at startup, so keep this list in step with those.
 const indexes = [
     // User indexes
     { collection: "users", index: { "email": 1 }, options: { unique: true } },
@@ -171,6 +173,11 @@ const indexes = [
     { collection: "capsule_permissions", index: { "shared_with_user_id": 1, "is_active": 1 } },
     { collection: "capsule_permissions", index: { "owner_id": 1 } },
     { collection: "capsule_permissions", index: { "expires_at": 1 } },
+    { collection: "capsule_permissions", index: { "capsule_id": 1, "shared_with_user_id": 1, "is_active": 1 } },
+    
+    // Notification and settings indexes
+    { collection: "system_notifications", index: { "user_id": 1, "created_at": -1 } },
+    { collection: "configuration_settings", index: { "user_id": 1, "setting_key": 1 }, options: { unique: true } },
     
     // Quantum indexes
     { collection: "quantum_circuits", index: { "user_id": 1, "created_at": -1 } },
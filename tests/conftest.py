@@ -0,0 +1,5 @@
+import os
+
+# Set before any app module reads them; see requirements-test.txt
+os.environ.setdefault("MONGO_BACKEND", "memory")
+os.environ.setdefault("REDIS_BACKEND", "fake")
@@ -0,0 +1,16 @@
+from app.services.auth_service import parse_user_rows
+
+
+def test_parse_user_rows_reports_rows_with_wrong_types_as_invalid():
+    rows = [
+        {"username": "ada", "email": "ada@example.com", "password": "secret"},
+        {"username": 123, "email": ["not", "a", "string"], "password": "secret"},
+        {"username": "bob", "email": "bob@example.com", "password": {"nested": True}},
+    ]
+
+    valid, invalid = parse_user_rows(rows)
+
+    assert [(index, user.username) for index, user in valid] == [(0, "ada")]
+    assert [(result.index, result.status) for result in invalid] == [(1, "invalid"), (2, "invalid")]
+    assert invalid[0].username is None and invalid[0].email is None
+    assert invalid[1].username == "bob" and "password" in invalid[1].detail
@@ -0,0 +1,32 @@
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+
+from app.database import get_database
+from app.models.capsule import CapsuleStatus
+from app.services.capsule_scheduler import CapsuleUnlockScheduler
+
+
+@pytest.mark.asyncio
+async def test_refill_pages_through_capsules_sharing_an_unlock_date():
+    db = await get_database()
+    await db.temporal_capsules.delete_many({})
+    unlock_date = (datetime.utcnow() + timedelta(minutes=5)).replace(microsecond=0)
+    await db.temporal_capsules.insert_many([
+        {"user_id": str(ObjectId()), "title": f"capsule {i}", "status": CapsuleStatus.LOCKED, "unlock_date": unlock_date}
+        for i in range(15)
+    ])
+
+    scheduler = CapsuleUnlockScheduler(horizon=3600, batch_size=10)
+    await scheduler.refill()
+    assert scheduler.get_stats()["scheduled"] == 10
+
+    # The next page continues within the same unlock_date instead of reloading or skipping it
+    await scheduler.refill()
+    stats = scheduler.get_stats()
+    assert stats["scheduled"] == 15
+    assert stats["next_unlock"] == unlock_date.isoformat()
+
+    await scheduler.refill()
+    assert scheduler.get_stats()["scheduled"] == 15